@@ -95,6 +95,15 @@ if ! grep -q "localhost:5005" ~/Library/Group\ Containers/group.com.docker/setti
   echo -e "${YELLOW}4. Click 'Apply & Restart'${NC}"
 fi
 
+# Set up a BuildKit builder that can push images and layer cache to the registry
+echo -e "\n${GREEN}Setting up Docker buildx builder...${NC}"
+if ! docker buildx inspect quickdeploy &> /dev/null; then
+  docker buildx create --name quickdeploy --driver docker-container --driver-opt network=host
+  echo -e "${GREEN}Buildx builder created${NC}"
+else
+  echo -e "${GREEN}Buildx builder already exists${NC}"
+fi
+
 # Setup local DNS for .quickdeploy.local domains
 echo -e "\n${GREEN}Setting up local DNS...${NC}"
 if ! grep -q "quickdeploy.local" /etc/hosts; then
@@ -117,7 +126,7 @@ fi
 
 # Install Python requirements
 echo -e "\n${GREEN}Installing Python dependencies...${NC}"
-pip3 install fastapi uvicorn redis kubernetes flask requests tabulate rich
+pip3 install fastapi uvicorn orjson redis aiosqlite docker kubernetes flask requests tabulate rich
 
 # Setup Kubernetes Nginx Ingress Controller
 echo -e "\n${GREEN}Setting up Ingress Controller...${NC}"
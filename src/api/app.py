@@ -1,17 +1,29 @@
 # app.py - FastAPI service for macOS
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from pydantic import BaseModel
-import sqlite3
 import os
-import redis
 import json
+import orjson
 import uuid
+import logging
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
-import os
+from fastapi.responses import ORJSONResponse
+import sys
+
+# Set up base path for module imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# Custom modules
+from api.db import init_database, SQLitePool
+from api.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_MAX_CONNECTIONS
+
+logger = logging.getLogger('quickdeploy')
 
 # Initialize FastAPI app
-app = FastAPI(title="QuickDeploy API")
+app = FastAPI(title="QuickDeploy API", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -22,80 +34,30 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Connect to Redis
-try:
-    redis_client = redis.Redis(host='localhost', port=6379, db=0)
-    redis_client.ping()  # Test connection
-    print("Connected to Redis successfully")
-except redis.ConnectionError as e:
-    print(f"Redis connection error: {e}")
-    print("Make sure Redis is running on localhost:6379")
-    print("You can start it with: docker run -d -p 6379:6379 --name redis redis:alpine")
+# Columns returned for deployment records
+DEPLOYMENT_COLUMNS = "id, repository, branch, commit_hash, status, created_at, updated_at, url"
 
-# Initialize SQLite database
-def init_db():
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quickdeploy.db')
-    
-    # Check if the file exists
-    db_exists = os.path.isfile(db_path)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create deployments table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS deployments (
-        id TEXT PRIMARY KEY,
-        repository TEXT,
-        branch TEXT,
-        commit_hash TEXT,
-        status TEXT,
-        created_at TEXT,
-        updated_at TEXT,
-        url TEXT
-    )
-    ''')
-    
-    # Create projects table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS projects (
-        id TEXT PRIMARY KEY,
-        name TEXT,
-        repository_url TEXT,
-        created_at TEXT
-    )
-    ''')
-    
-    # Create stacks table for managing microservice stacks
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS stacks (
-        id TEXT PRIMARY KEY,
-        name TEXT,
-        description TEXT,
-        created_at TEXT
-    )
-    ''')
-    
-    # Create stack_services table for services that belong to a stack
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS stack_services (
-        id TEXT PRIMARY KEY,
-        stack_id TEXT,
-        service_name TEXT,
-        repository TEXT,
-        service_type TEXT,
-        configuration TEXT,
-        FOREIGN KEY (stack_id) REFERENCES stacks (id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    
-    if not db_exists:
-        print(f"Created new database at {db_path}")
-    else:
-        print(f"Using existing database at {db_path}")
+# SQLite connection pool, created on startup
+pool = None
+
+# Async Redis client, created on first use by get_redis()
+redis_client = None
+
+def get_redis():
+    """Return the shared async Redis client, importing redis lazily"""
+    global redis_client
+    if redis_client is None:
+        import redis.asyncio
+        # Bounded pool: concurrent requests wait for a free connection instead
+        # of opening an unlimited number of sockets under load
+        connection_pool = redis.asyncio.BlockingConnectionPool(
+            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+            max_connections=REDIS_MAX_CONNECTIONS, timeout=5,
+            socket_timeout=5, socket_keepalive=True
+        )
+        # from_pool hands the pool to the client, so aclose() disconnects it too
+        redis_client = redis.asyncio.Redis.from_pool(connection_pool)
+    return redis_client
 
 # Models
 class Project(BaseModel):
@@ -119,61 +81,102 @@ class StackService(BaseModel):
     service_type: str = "web"
     configuration: dict = {}
 
-# Initialize database on startup
+# Initialize database, connection pool and Redis on startup
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    global pool
+    init_database()
+    pool = SQLitePool(min(32, (os.cpu_count() or 4) * 4))
+    await pool.open()
+    
+    # Connect to Redis
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    try:
+        await get_redis().ping()  # Test connection
+        print("Connected to Redis successfully")
+    except RedisConnectionError as e:
+        print(f"Redis connection error: {e}")
+        print("Make sure Redis is running on localhost:6379")
+        print("You can start it with: docker run -d -p 6379:6379 --name redis redis:alpine")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if pool is not None:
+        await pool.close()
+    if redis_client is not None:
+        await redis_client.aclose()
+
+def rows_to_dicts(cursor, rows):
+    """Convert plain tuple rows to dicts keyed by the cursor's column names"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+async def persist_and_enqueue(deploy_job):
+    """Record a queued deployment and push its build job onto the worker queue"""
+    # Runs after the response was sent, so failures can only be logged and
+    # reflected in the deployment's status
+    deployment_id = deploy_job["id"]
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO deployments 
+                   (id, repository, branch, commit_hash, status, created_at, updated_at, url) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (deployment_id, deploy_job["repository"], deploy_job["branch"],
+                 deploy_job["commit_hash"], "queued", deploy_job["created_at"], deploy_job["created_at"], "")
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Could not record deployment {deployment_id}: {e}")
+        return
+    
+    try:
+        await get_redis().lpush("build_queue", orjson.dumps(deploy_job))
+    except Exception as e:
+        logger.error(f"Could not enqueue deployment {deployment_id}: {e}")
+        # No worker will ever pick it up, so don't leave it showing as queued
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(
+                    "UPDATE deployments SET status = ?, updated_at = ? WHERE id = ?",
+                    ("failed", datetime.now().isoformat(), deployment_id)
+                )
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"Could not mark deployment {deployment_id} as failed: {e}")
 
 # API endpoints
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "QuickDeploy API is running"}
 
 @app.post("/projects/")
-def create_project(project: Project):
+async def create_project(project: Project):
     project_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
-    conn = sqlite3.connect('quickdeploy.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO projects (id, name, repository_url, created_at) VALUES (?, ?, ?, ?)",
-        (project_id, project.name, project.repository_url, created_at)
-    )
-    conn.commit()
-    conn.close()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO projects (id, name, repository_url, created_at) VALUES (?, ?, ?, ?)",
+            (project_id, project.name, project.repository_url, created_at)
+        )
+        await conn.commit()
     
     return {"id": project_id, "name": project.name, "created_at": created_at}
 
 @app.get("/projects/")
-def list_projects():
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM projects")
-    projects = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+async def list_projects():
+    async with pool.acquire() as conn:
+        cursor = await conn.execute("SELECT id, name, repository_url, created_at FROM projects")
+        projects = rows_to_dicts(cursor, await cursor.fetchall())
     
     return {"projects": projects}
 
 @app.post("/deployments/")
-def create_deployment(deployment: Deployment, background_tasks: BackgroundTasks):
+async def create_deployment(deployment: Deployment, background_tasks: BackgroundTasks):
     deployment_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
-    conn = sqlite3.connect('quickdeploy.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        """INSERT INTO deployments 
-           (id, repository, branch, commit_hash, status, created_at, updated_at, url) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (deployment_id, deployment.repository, deployment.branch, 
-         deployment.commit_hash, "queued", created_at, created_at, "")
-    )
-    conn.commit()
-    conn.close()
-    
-    # Add to Redis queue
     deploy_job = {
         "id": deployment_id,
         "repository": deployment.repository,
@@ -186,7 +189,10 @@ def create_deployment(deployment: Deployment, background_tasks: BackgroundTasks)
     if deployment.env_vars:
         deploy_job["env_vars"] = deployment.env_vars
     
-    redis_client.lpush("build_queue", json.dumps(deploy_job))
+    # Persist and enqueue after the response is sent so neither the SQLite
+    # commit nor the Redis round trip is on the request's critical path.
+    # A client polling immediately may briefly get a 404 for the new ID.
+    background_tasks.add_task(persist_and_enqueue, deploy_job)
     
     return {
         "id": deployment_id,
@@ -196,107 +202,119 @@ def create_deployment(deployment: Deployment, background_tasks: BackgroundTasks)
     }
 
 @app.get("/deployments/")
-def list_deployments():
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM deployments ORDER BY created_at DESC")
-    deployments = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    return {"deployments": deployments}
+async def list_deployments(limit: int = Query(None, ge=1, le=1000), cursor: str = None):
+    # Newest first. Everything is returned unless a limit is given; then pass
+    # the returned next_cursor back to fetch the next page of older deployments
+    query = f"SELECT {DEPLOYMENT_COLUMNS} FROM deployments"
+    params = []
+    if cursor:
+        # Cursor is "<created_at>|<id>" of the last row on the previous page;
+        # the id breaks ties between deployments created in the same batch
+        cursor_created_at, _, cursor_id = cursor.partition("|")
+        query += " WHERE (created_at, id) < (?, ?)"
+        params += [cursor_created_at, cursor_id]
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    async with pool.acquire() as conn:
+        result = await conn.execute(query, params)
+        deployments = rows_to_dicts(result, await result.fetchall())
+    
+    next_cursor = None
+    if limit and len(deployments) == limit:
+        next_cursor = f"{deployments[-1]['created_at']}|{deployments[-1]['id']}"
+    return {"deployments": deployments, "next_cursor": next_cursor}
 
 @app.get("/deployments/{deployment_id}")
-def get_deployment(deployment_id: str):
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM deployments WHERE id = ?", (deployment_id,))
-    deployment = cursor.fetchone()
-    conn.close()
+async def get_deployment(deployment_id: str):
+    async with pool.acquire() as conn:
+        cursor = await conn.execute(f"SELECT {DEPLOYMENT_COLUMNS} FROM deployments WHERE id = ?", (deployment_id,))
+        deployment = await cursor.fetchone()
     
     if deployment is None:
         raise HTTPException(status_code=404, detail="Deployment not found")
     
-    return dict(deployment)
+    return rows_to_dicts(cursor, [deployment])[0]
 
 # Stack management endpoints
 @app.post("/stacks/")
-def create_stack(stack: Stack):
+async def create_stack(stack: Stack):
     stack_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
-    conn = sqlite3.connect('quickdeploy.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO stacks (id, name, description, created_at) VALUES (?, ?, ?, ?)",
-        (stack_id, stack.name, stack.description, created_at)
-    )
-    conn.commit()
-    conn.close()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO stacks (id, name, description, created_at) VALUES (?, ?, ?, ?)",
+            (stack_id, stack.name, stack.description, created_at)
+        )
+        await conn.commit()
     
     return {"id": stack_id, "name": stack.name, "created_at": created_at}
 
 @app.get("/stacks/")
-def list_stacks():
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM stacks")
-    stacks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+async def list_stacks():
+    async with pool.acquire() as conn:
+        cursor = await conn.execute("SELECT id, name, description, created_at FROM stacks")
+        stacks = rows_to_dicts(cursor, await cursor.fetchall())
     
     return {"stacks": stacks}
 
 @app.get("/stacks/{stack_id}")
-def get_stack(stack_id: str):
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Get stack details
-    cursor.execute("SELECT * FROM stacks WHERE id = ?", (stack_id,))
-    stack = cursor.fetchone()
+async def get_stack(stack_id: str):
+    # Fetch the stack and its services in a single query
+    async with pool.acquire() as conn:
+        cursor = await conn.execute(
+            """SELECT s.id, s.name, s.description, s.created_at,
+                      ss.id, ss.service_name, ss.repository, ss.service_type, ss.configuration
+               FROM stacks s LEFT JOIN stack_services ss ON ss.stack_id = s.id
+               WHERE s.id = ?""",
+            (stack_id,)
+        )
+        rows = await cursor.fetchall()
     
-    if stack is None:
-        conn.close()
+    if not rows:
         raise HTTPException(status_code=404, detail="Stack not found")
     
-    # Get services in this stack
-    cursor.execute("SELECT * FROM stack_services WHERE stack_id = ?", (stack_id,))
-    services = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    
-    result = dict(stack)
-    result["services"] = services
+    stack_id, name, description, created_at = rows[0][:4]
+    result = {"id": stack_id, "name": name, "description": description, "created_at": created_at}
+    result["services"] = [
+        {
+            "id": service_id,
+            "stack_id": stack_id,
+            "service_name": service_name,
+            "repository": repository,
+            "service_type": service_type,
+            "configuration": configuration
+        }
+        for _, _, _, _, service_id, service_name, repository, service_type, configuration in rows
+        if service_id is not None
+    ]
     
     return result
 
 @app.post("/stacks/{stack_id}/services")
-def add_service_to_stack(stack_id: str, service: StackService):
-    # Verify stack exists
-    conn = sqlite3.connect('quickdeploy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM stacks WHERE id = ?", (stack_id,))
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Stack not found")
-    
-    service_id = str(uuid.uuid4())
-    
-    # Store configuration as JSON
-    configuration_json = json.dumps(service.configuration)
-    
-    cursor.execute(
-        """INSERT INTO stack_services 
-           (id, stack_id, service_name, repository, service_type, configuration) 
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (service_id, stack_id, service.service_name, service.repository, 
-         service.service_type, configuration_json)
-    )
-    conn.commit()
-    conn.close()
+async def add_service_to_stack(stack_id: str, service: StackService):
+    async with pool.acquire() as conn:
+        # Verify stack exists
+        cursor = await conn.execute("SELECT id FROM stacks WHERE id = ?", (stack_id,))
+        if not await cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Stack not found")
+        
+        service_id = str(uuid.uuid4())
+        
+        # Store configuration as JSON
+        configuration_json = json.dumps(service.configuration)
+        
+        await conn.execute(
+            """INSERT INTO stack_services 
+               (id, stack_id, service_name, repository, service_type, configuration) 
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (service_id, stack_id, service.service_name, service.repository, 
+             service.service_type, configuration_json)
+        )
+        await conn.commit()
     
     return {
         "id": service_id,
@@ -305,54 +323,77 @@ def add_service_to_stack(stack_id: str, service: StackService):
     }
 
 @app.post("/stacks/{stack_id}/deploy")
-def deploy_stack(stack_id: str, background_tasks: BackgroundTasks):
-    # Verify stack exists and get services
-    conn = sqlite3.connect('quickdeploy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM stacks WHERE id = ?", (stack_id,))
-    stack = cursor.fetchone()
-    
-    if not stack:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Stack not found")
-    
-    cursor.execute("SELECT * FROM stack_services WHERE stack_id = ?", (stack_id,))
-    services = cursor.fetchall()
-    
-    if not services:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Stack has no services")
-    
-    # Create deployments for each service
-    deployment_ids = []
-    created_at = datetime.now().isoformat()
-    
-    for service in services:
-        deployment_id = str(uuid.uuid4())
-        cursor.execute(
-            """INSERT INTO deployments 
-               (id, repository, branch, commit_hash, status, created_at, updated_at, url) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (deployment_id, service["repository"], "main", "HEAD", "queued", created_at, created_at, "")
+async def deploy_stack(stack_id: str, background_tasks: BackgroundTasks):
+    async with pool.acquire() as conn:
+        # Verify stack exists and get services
+        cursor = await conn.execute("SELECT id FROM stacks WHERE id = ?", (stack_id,))
+        stack = await cursor.fetchone()
+        
+        if not stack:
+            raise HTTPException(status_code=404, detail="Stack not found")
+        
+        cursor = await conn.execute(
+            "SELECT service_name, repository FROM stack_services WHERE stack_id = ?",
+            (stack_id,)
         )
+        services = await cursor.fetchall()
         
-        # Add to Redis queue
-        deploy_job = {
-            "id": deployment_id,
-            "repository": service["repository"],
-            "branch": "main",
-            "commit_hash": "HEAD",
-            "created_at": created_at,
-            "stack_id": stack_id,
-            "service_name": service["service_name"]
-        }
-        redis_client.lpush("build_queue", json.dumps(deploy_job))
-        deployment_ids.append(deployment_id)
-    
-    conn.commit()
-    conn.close()
+        if not services:
+            raise HTTPException(status_code=400, detail="Stack has no services")
+        
+        # Create deployments for each service
+        created_at = datetime.now().isoformat()
+        # Draw the randomness for every deployment ID in one urandom call
+        raw = os.urandom(16 * len(services))
+        deployment_ids = [str(uuid.UUID(bytes=raw[i * 16:(i + 1) * 16], version=4)) for i in range(len(services))]
+        rows = [
+            (deployment_id, repository, "main", "HEAD", "queued", created_at, created_at, "")
+            for deployment_id, (service_name, repository) in zip(deployment_ids, services)
+        ]
+        deploy_jobs = [
+            {
+                "id": deployment_id,
+                "repository": repository,
+                "branch": "main",
+                "commit_hash": "HEAD",
+                "created_at": created_at,
+                "stack_id": stack_id,
+                "service_name": service_name
+            }
+            for deployment_id, (service_name, repository) in zip(deployment_ids, services)
+        ]
+        
+        # Insert all rows in one batch and commit before queueing, so a worker
+        # never picks up a job whose row it can't see yet
+        try:
+            await conn.executemany(
+                """INSERT INTO deployments 
+                   (id, repository, branch, commit_hash, status, created_at, updated_at, url) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to record stack deployment: {e}")
+        
+        # Queue all build jobs in a single Redis round trip
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for deploy_job in deploy_jobs:
+                pipe.lpush("build_queue", orjson.dumps(deploy_job))
+            await pipe.execute()
+        except Exception as e:
+            # Don't leave the rows showing as queued forever. If the pipeline
+            # failed part way, a job that did get queued overwrites its own
+            # status once the worker picks it up
+            logger.error(f"Could not enqueue stack {stack_id}: {e}")
+            await conn.executemany(
+                "UPDATE deployments SET status = ?, updated_at = ? WHERE id = ?",
+                [("failed", datetime.now().isoformat(), deployment_id) for deployment_id in deployment_ids]
+            )
+            await conn.commit()
+            raise HTTPException(status_code=500, detail=f"Failed to queue stack deployment: {e}")
     
     return {
         "stack_id": stack_id,
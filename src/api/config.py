@@ -7,6 +7,8 @@ INGRESS_PORT = 8090
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 REDIS_DB = int(os.environ.get('REDIS_DB', 0))
+# Upper bound on pooled connections per process
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 32))
 
 # Database configuration
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,10 +16,16 @@ DB_PATH = os.path.join(current_dir, 'quickdeploy.db')
 
 # Docker registry
 DOCKER_REGISTRY = os.environ.get('DOCKER_REGISTRY', 'localhost:5005')
+# Buildx builder created by install.sh; the default docker driver cannot export registry cache
+BUILDX_BUILDER = os.environ.get('BUILDX_BUILDER', 'quickdeploy')
 
 # Kubernetes configuration
 K8S_NAMESPACE = os.environ.get('K8S_NAMESPACE', 'default')
 
+# Add each deployment's host name to /etc/hosts. Disable when *.quickdeploy.local
+# already resolves locally (e.g. dnsmasq --address=/quickdeploy.local/127.0.0.1)
+MANAGE_HOSTS_FILE = os.environ.get('MANAGE_HOSTS_FILE', '1') != '0'
+
 # Project type configurations
 FRONTEND_TYPES = ["nextjs", "react", "vue"]
 BACKEND_TYPES = ["flask", "django", "express", "nodejs", "python"]
@@ -36,4 +44,4 @@ DEFAULT_PORTS = {
 }
 
 # Non-service directories to skip
-SKIP_DIRECTORIES = ['node_modules', '__pycache__', 'venv', 'env', 'dist', 'build']
\ No newline at end of file
+SKIP_DIRECTORIES = frozenset(['node_modules', '__pycache__', 'venv', 'env', 'dist', 'build'])
\ No newline at end of file
@@ -1,18 +1,104 @@
 import sqlite3
+import threading
+import aiosqlite
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 import json
 import logging
-import os
-current_dir = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(current_dir, 'quickdeploy.db')
+from .config import DB_PATH
 
 logger = logging.getLogger('quickdeploy')
 
+# Bump whenever the schema in init_database() changes
+SCHEMA_VERSION = 2
+
+# Per-connection tuning. journal_mode=WAL is persistent in the database
+# header, so it is only set once from init_database().
+CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA wal_autocheckpoint=1000",
+]
+
+def get_conn():
+    """Open a SQLite connection with the QuickDeploy pragmas applied"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Connection shared by every status update in the worker, opened on first use
+status_conn = None
+status_conn_lock = threading.Lock()
+
+def get_status_conn():
+    """Get the shared connection used for deployment status updates"""
+    global status_conn
+    if status_conn is None:
+        with status_conn_lock:
+            if status_conn is None:
+                status_conn = get_conn()
+    return status_conn
+
+def close_conn(conn):
+    """Close a connection, letting SQLite refresh its query planner statistics first"""
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+async def get_async_conn():
+    """Open an aiosqlite connection with the QuickDeploy pragmas applied"""
+    conn = await aiosqlite.connect(DB_PATH)
+    for pragma in CONNECTION_PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+class SQLitePool:
+    """Pool of pre-opened aiosqlite connections for the async API"""
+
+    def __init__(self, size):
+        self.size = size
+        self._connections = asyncio.LifoQueue(maxsize=size)
+
+    async def open(self):
+        """Open every connection in the pool"""
+        for _ in range(self.size):
+            self._connections.put_nowait(await get_async_conn())
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection, returning it to the pool when done"""
+        conn = await self._connections.get()
+        try:
+            yield conn
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            self._connections.put_nowait(conn)
+
+    async def close(self):
+        """Close every idle connection in the pool"""
+        while not self._connections.empty():
+            conn = self._connections.get_nowait()
+            await conn.execute("PRAGMA optimize")
+            await conn.close()
+
 def init_database():
     """Initialize the SQLite database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_conn()
         cursor = conn.cursor()
+        
+        # Skip the DDL when the schema is already current
+        if cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            close_conn(conn)
+            return True
+        
+        conn.execute("PRAGMA journal_mode=WAL")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS deployments (
             id TEXT PRIMARY KEY,
@@ -34,8 +120,37 @@ def init_database():
             created_at TEXT
         )
         ''')
+        
+        # Create stacks table for managing microservice stacks
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stacks (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            description TEXT,
+            created_at TEXT
+        )
+        ''')
+        
+        # Create stack_services table for services that belong to a stack
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stack_services (
+            id TEXT PRIMARY KEY,
+            stack_id TEXT,
+            service_name TEXT,
+            repository TEXT,
+            service_type TEXT,
+            configuration TEXT,
+            FOREIGN KEY (stack_id) REFERENCES stacks (id)
+        )
+        ''')
+        
+        # Index stack lookups and the newest-first deployments listing
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stack_services_stack_id ON stack_services(stack_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_deployments_created_at ON deployments(created_at DESC, id DESC)")
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
-        conn.close()
+        close_conn(conn)
         logger.info("Database initialized successfully")
         return True
     except Exception as e:
@@ -45,23 +160,22 @@ def init_database():
 def update_deployment_status(deployment_id, status, url=""):
     """Update deployment status in database"""
     try:
-        # Update database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        # Update database on the shared connection instead of opening one per update
+        conn = get_status_conn()
         updated_at = datetime.now().isoformat()
         
-        print(f"DB: Updating deployment {deployment_id} to status={status}, url={url}")
-        cursor.execute(
-            "UPDATE deployments SET status = ?, updated_at = ?, url = ? WHERE id = ?",
-            (status, updated_at, url, deployment_id)
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Updating deployment {deployment_id} to status={status}, url={url}")
+        with status_conn_lock, conn:
+            cursor = conn.execute(
+                "UPDATE deployments SET status = ?, updated_at = ?, url = ? WHERE id = ?",
+                (status, updated_at, url, deployment_id)
+            )
         rows_affected = cursor.rowcount
-        conn.commit()
-        conn.close()
         
-        print(f"DB: Update complete, {rows_affected} rows affected")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Update complete, {rows_affected} rows affected")
         logger.info(f"Updated deployment {deployment_id} status to {status}")
             
     except Exception as e:
-        print(f"DB UPDATE ERROR: {e}")
         logger.error(f"Error updating deployment status: {e}")
\ No newline at end of file
@@ -0,0 +1,17 @@
+import asyncio
+from .project import detect_project_type
+from .port import detect_port
+
+async def detect_all(directory):
+    """
+    Run project and port detection for a directory in a worker thread
+    Returns: (project_type, project_directory, port)
+    """
+    project_type, project_dir = await asyncio.to_thread(detect_project_type, directory)
+    # Port detection depends on the project type
+    port = await asyncio.to_thread(detect_port, project_type, project_dir)
+    return project_type, project_dir, port
+
+async def detect_services(directories):
+    """Run detect_all for several service directories concurrently"""
+    return await asyncio.gather(*(detect_all(directory) for directory in directories))
\ No newline at end of file
@@ -1,10 +1,19 @@
 import os
-import json
 import logging
-import yaml
+from ..utils.cache import directory_cache
+import orjson
 
 logger = logging.getLogger('quickdeploy')
 
+# Node.js packages that indicate a PostgreSQL dependency
+POSTGRES_NODE_PACKAGES = ("pg", "postgres", "typeorm", "sequelize")
+POSTGRES_NODE_MARKERS = tuple(f'"{pkg}"'.encode() for pkg in POSTGRES_NODE_PACKAGES)
+
+# Python requirements that indicate a PostgreSQL dependency
+POSTGRES_PYTHON_PACKAGES = ("psycopg2", "sqlalchemy", "flask-sqlalchemy")
+POSTGRES_PYTHON_MARKERS = tuple(pkg.encode() for pkg in POSTGRES_PYTHON_PACKAGES)
+
+@directory_cache()
 def detect_database_needs(project_dir):
     """Detect database requirements from code"""
     database_needs = []
@@ -12,9 +21,13 @@ def detect_database_needs(project_dir):
     # Check for quickdeploy.yaml
     config_path = os.path.join(project_dir, "quickdeploy.yaml")
     if os.path.exists(config_path):
+        import yaml
+        
+        # Prefer the libyaml-backed loader when PyYAML was built with it
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
         try:
-            with open(config_path) as f:
-                config = yaml.safe_load(f)
+            with open(config_path, "rb") as f:
+                config = yaml.load(f, Loader=loader)
                 if config and "databases" in config:
                     for name, db_config in config["databases"].items():
                         database_needs.append(db_config)
@@ -26,15 +39,16 @@ def detect_database_needs(project_dir):
     package_json_path = os.path.join(project_dir, "package.json")
     if os.path.exists(package_json_path):
         try:
-            with open(package_json_path) as f:
-                data = json.load(f)
-                deps = {}
-                if "dependencies" in data:
-                    deps.update(data["dependencies"])
-                if "devDependencies" in data:
-                    deps.update(data["devDependencies"])
+            with open(package_json_path, "rb") as f:
+                raw = f.read()
+            
+            # Only parse package.json when one of the package names appears at all
+            if any(marker in raw for marker in POSTGRES_NODE_MARKERS):
+                data = orjson.loads(raw)
+                deps = data.get("dependencies") or {}
+                dev_deps = data.get("devDependencies") or {}
                 
-                if any(pkg in deps for pkg in ["pg", "postgres", "typeorm", "sequelize"]):
+                if any(pkg in deps or pkg in dev_deps for pkg in POSTGRES_NODE_PACKAGES):
                     database_needs.append({"type": "postgres", "version": "14"})
         except Exception as e:
             logger.warning(f"Error parsing package.json: {e}")
@@ -43,9 +57,9 @@ def detect_database_needs(project_dir):
     req_path = os.path.join(project_dir, "requirements.txt")
     if os.path.exists(req_path):
         try:
-            with open(req_path) as f:
+            with open(req_path, "rb") as f:
                 content = f.read().lower()
-                if "psycopg2" in content or "sqlalchemy" in content or "flask-sqlalchemy" in content:
+                if any(marker in content for marker in POSTGRES_PYTHON_MARKERS):
                     database_needs.append({"type": "postgres", "version": "14"})
         except Exception as e:
             logger.warning(f"Error parsing requirements.txt: {e}")
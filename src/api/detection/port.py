@@ -1,10 +1,31 @@
 import os
 import re
-import json
+import mmap
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from ..config import SKIP_DIRECTORIES
+from ..utils.cache import directory_cache
+from .project import load_package_json
 
 logger = logging.getLogger('quickdeploy')
 
+# Common port definitions in Python apps, merged into one pattern so each
+# file is scanned once. Compiled as bytes so it can run over a mmap directly
+PYTHON_PORT_RE = re.compile(
+    rb'(?:port\s*=\s*|PORT\s*=\s*|\.run\([^)]*port\s*=\s*|app\.run\([^)]*port\s*=\s*)(\d+)'
+)
+# Limits for the scan of Python sources: directory levels below the
+# project and bytes searched at the start of each file
+PORT_SCAN_DEPTH = 3
+PORT_SCAN_BYTES = 65536
+# Explicit ports passed on the command line of package.json scripts
+NODE_PORT_RE = re.compile(r"-p\s*(\d+)|--port\s*(\d+)|PORT=(\d+)")
+
+# Shared by every port scan; detection already runs on several threads at
+# once, so each call must not start a pool of its own
+scan_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="port-scan")
+
+@directory_cache()
 def detect_port(project_type, project_dir):
     """Detects the port of the project dynamically."""
     # Default fallbacks
@@ -37,20 +58,20 @@ def detect_port(project_type, project_dir):
 def detect_node_port(project_dir):
     """Detect the port a Node.js app will use"""
     try:
-        with open(os.path.join(project_dir, "package.json")) as f:
-            package_data = json.load(f)
+        package_data = load_package_json(os.path.join(project_dir, "package.json"))
         
         # First check for explicit port in custom scripts
-        if "scripts" in package_data:
-            for script_value in package_data["scripts"].values():
-                port_match = re.search(r"-p\s*(\d+)|--port\s*(\d+)|PORT=(\d+)", script_value)
+        scripts = package_data.get("scripts")
+        if scripts:
+            for script_value in scripts.values():
+                port_match = NODE_PORT_RE.search(script_value)
                 if port_match:
                     port = next(p for p in port_match.groups() if p is not None)
                     return int(port)
         
         # Default ports by framework
-        if "dependencies" in package_data:
-            deps = package_data["dependencies"]
+        deps = package_data.get("dependencies")
+        if deps:
             if "next" in deps:
                 return 3000  # Next.js default
             elif "nuxt" in deps:
@@ -69,39 +90,61 @@ def detect_node_port(project_dir):
 def detect_python_port(project_dir):
     """Detect the port a Python app will use"""
     try:
-        # Look for common patterns in Python files
-        for root, dirs, files in os.walk(project_dir):
-            for file in files:
-                if file.endswith('.py'):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, 'r') as f:
-                        content = f.read()
-                        
-                        # Look for common port definitions
-                        port_patterns = [
-                            r'port\s*=\s*(\d+)',
-                            r'PORT\s*=\s*(\d+)',
-                            r'\.run\(.*port\s*=\s*(\d+)',
-                            r'app\.run\(.*port\s*=\s*(\d+)'
-                        ]
-                        
-                        for pattern in port_patterns:
-                            match = re.search(pattern, content)
-                            if match:
-                                return int(match.group(1))
+        # Look for common patterns in Python files near the top of the
+        # project. The walk collects them all before any is scanned, so every
+        # file can be queued on scan_pool at once
+        source_files = []
+        base_depth = project_dir.rstrip(os.sep).count(os.sep)
+        for root, dirs, files in os.walk(project_dir, followlinks=False):
+            # Prune skipped and hidden directories (.git, .venv, ...) in place so
+            # os.walk never descends into them
+            if root.count(os.sep) - base_depth >= PORT_SCAN_DEPTH:
+                dirs[:] = []
+            else:
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRECTORIES and not d.startswith('.')]
+            source_files.extend(os.path.join(root, file) for file in files if file.endswith('.py'))
         
-        # Default by framework detection
-        if os.path.exists(os.path.join(project_dir, 'requirements.txt')):
-            with open(os.path.join(project_dir, 'requirements.txt')) as f:
+        futures = [scan_pool.submit(scan_python_port, file_path) for file_path in source_files]
+        try:
+            # Results are read in walk order, so the first file with a port still wins
+            for future in futures:
+                port = future.result()
+                if port:
+                    return port
+        finally:
+            # Files not yet started are not worth scanning any more
+            for future in futures:
+                future.cancel()
+        
+        # Nothing set explicitly, so fall back to the framework's default
+        try:
+            with open(os.path.join(project_dir, 'requirements.txt'), 'rb') as f:
                 req_content = f.read().lower()
-                if 'flask' in req_content:
-                    return 5000  # Flask default
-                elif 'django' in req_content:
-                    return 8000  # Django default
-                elif 'fastapi' in req_content:
-                    return 8000  # FastAPI default
+            if b'flask' in req_content:
+                return 5000  # Flask default
+            elif b'django' in req_content:
+                return 8000  # Django default
+            elif b'fastapi' in req_content:
+                return 8000  # FastAPI default
+        except FileNotFoundError:
+            pass
         
         return 5000  # General Python default
     except Exception as e:
         logger.warning(f"Error detecting Python port: {e}")
-        return 5000  # Default fallback
\ No newline at end of file
+        return 5000  # Default fallback
+
+def scan_python_port(file_path):
+    """Return the port set in a Python source file, or None if there isn't one"""
+    with open(file_path, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Ports are set near the top of an app, so only the
+            # head of each file is searched (and paged in)
+            if mm.find(b'port', 0, PORT_SCAN_BYTES) == -1 and mm.find(b'PORT', 0, PORT_SCAN_BYTES) == -1:
+                return None
+            
+            match = PYTHON_PORT_RE.search(mm, 0, PORT_SCAN_BYTES)
+            return int(match.group(1)) if match else None
\ No newline at end of file
@@ -1,71 +1,124 @@
 import os
-import json
 import logging
-from ..config import DEFAULT_PORTS
+from collections import deque
+from ..config import DEFAULT_PORTS, SKIP_DIRECTORIES
+from ..utils.cache import directory_cache
+import orjson
 
 logger = logging.getLogger('quickdeploy')
 
+# How many directory levels below a service directory to look for a nested project
+PROJECT_SEARCH_DEPTH = 3
+
+@directory_cache()
+def load_package_json(package_json_path):
+    """
+    Parse a package.json, cached on its path and mtime so project type, port
+    and database detection share one parse per file
+    """
+    with open(package_json_path, 'rb') as f:
+        return orjson.loads(f.read())
+
+@directory_cache()
 def detect_project_type(directory):
     """
     Detect the type of project in a directory
     Returns: (project_type, project_directory)
     """
-    if not os.path.isdir(directory):
+    # One directory read answers every "does this file exist" question below
+    try:
+        with os.scandir(directory) as listing:
+            entries = {entry.name: entry for entry in listing}
+    except OSError:
         return "unknown", directory
+    
+    return detect_project_type_from_entries(directory, entries)
+
+def detect_project_type_from_entries(directory, entries):
+    """
+    Detect the type of project in a directory whose listing was already read
+    - entries: Dictionary mapping file names in directory to their os.DirEntry
+    Returns: (project_type, project_directory)
+    """
+    project_type = detect_type_from_markers(entries)
+    if project_type:
+        return project_type, directory
+    
+    # If no recognized project type, search subdirectories breadth-first
+    # to find potential nested projects (common in monorepos)
+    pending = deque((entry.path, 1) for entry in subdirectories(entries))
+    while pending:
+        path, depth = pending.popleft()
+        try:
+            with os.scandir(path) as listing:
+                sub_entries = {entry.name: entry for entry in listing}
+        except OSError:
+            continue
         
+        project_type = detect_type_from_markers(sub_entries)
+        if project_type:
+            return project_type, path
+        if depth < PROJECT_SEARCH_DEPTH:
+            pending.extend((entry.path, depth + 1) for entry in subdirectories(sub_entries))
+    
+    return "unknown", directory
+
+def subdirectories(entries):
+    """Yield the directory entries worth searching for a nested project"""
+    for entry in entries.values():
+        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.') and entry.name not in SKIP_DIRECTORIES:
+            yield entry
+
+def detect_type_from_markers(entries):
+    """
+    Detect a project type from the marker files in a directory listing
+    Returns: the project type, or None if no marker identifies one
+    """
     # Check for package.json (Node.js)
-    package_json_path = os.path.join(directory, "package.json")
-    if os.path.exists(package_json_path):
+    if "package.json" in entries:
+        package_json_path = entries["package.json"].path
         try:
-            with open(package_json_path) as f:
-                package_json = json.load(f)
+            package_json = load_package_json(package_json_path)
+            deps = package_json.get("dependencies") or {}
             
             # Check for Next.js
-            if "dependencies" in package_json and "next" in package_json["dependencies"]:
-                return "nextjs", directory
+            if "next" in deps:
+                return "nextjs"
             # Check for React
-            elif "dependencies" in package_json and "react" in package_json["dependencies"]:
-                if "react-dom" in package_json["dependencies"]:
-                    return "react", directory
+            elif "react" in deps:
+                if "react-dom" in deps:
+                    return "react"
             # Check for Vue.js
-            elif "dependencies" in package_json and "vue" in package_json["dependencies"]:
-                return "vue", directory
+            elif "vue" in deps:
+                return "vue"
             # Check for Express
-            elif "dependencies" in package_json and "express" in package_json["dependencies"]:
-                return "nodejs", directory
+            elif "express" in deps:
+                return "nodejs"
             else:
-                return "nodejs", directory
+                return "nodejs"
         except Exception as e:
             logger.warning(f"Error parsing package.json: {e}")
             
     # Check for requirements.txt (Python)
-    requirements_path = os.path.join(directory, "requirements.txt")
-    if os.path.exists(requirements_path):
+    if "requirements.txt" in entries:
+        requirements_path = entries["requirements.txt"].path
         try:
-            with open(requirements_path) as f:
+            # Package names are ASCII, so match on the raw bytes without decoding
+            with open(requirements_path, 'rb') as f:
                 requirements = f.read().lower()
                 
             # Check for Flask
-            if "flask" in requirements:
-                return "flask", directory
+            if b"flask" in requirements:
+                return "flask"
             # Check for Django
-            elif "django" in requirements:
-                return "django", directory
+            elif b"django" in requirements:
+                return "django"
             else:
-                return "python", directory
+                return "python"
         except Exception as e:
             logger.warning(f"Error reading requirements.txt: {e}")
     
-    # If no recognized project type, recurse into subdirectories
-    # to find potential nested projects (common in monorepos)
-    for item in os.listdir(directory):
-        item_path = os.path.join(directory, item)
-        if os.path.isdir(item_path) and not item.startswith('.') and item not in ['node_modules', '__pycache__', 'venv']:
-            project_type, project_dir = detect_project_type(item_path)
-            if project_type != "unknown":
-                return project_type, project_dir
-    
-    return "unknown", directory
+    return None
 
 def detect_default_port(project_type):
     """Return the default port for a project type"""
@@ -1,15 +1,30 @@
-from kubernetes import client, config
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from urllib3.connection import HTTPConnection
+from ..config import K8S_NAMESPACE
 
 logger = logging.getLogger('quickdeploy')
 
+# API paths for the resource kinds QuickDeploy applies
+RESOURCE_PATHS = {
+    "Deployment": "/apis/apps/v1/namespaces/{namespace}/deployments/{name}",
+    "Service": "/api/v1/namespaces/{namespace}/services/{name}",
+    "Ingress": "/apis/networking.k8s.io/v1/namespaces/{namespace}/ingresses/{name}",
+}
+
 class KubernetesClient:
     _instance = None
+    _instance_lock = threading.Lock()
     
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = KubernetesClient()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = KubernetesClient()
         return cls._instance
     
     def __init__(self):
@@ -17,11 +32,47 @@ class KubernetesClient:
         self.apps_v1 = None
         self.networking_v1 = None
         self.initialized = False
+        self.lock = threading.Lock()
+        # Long-lived workers for applying several manifests in one batch
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="k8s-apply")
+        # Deployment cache kept current by one shared watch stream
+        self.deployments_by_name = {}
+        self.deployments_changed = threading.Condition()
+        self.watch_thread = None
+    
+    def create_api_clients(self, client):
+        """Create the API groups on one shared, pooled ApiClient"""
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = 32
+        api_client = client.ApiClient(configuration)
+        
+        # Keep idle pooled connections alive so calls reuse the same TLS session
+        pool_manager = api_client.rest_client.pool_manager
+        pool_manager.connection_pool_kw["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ]
+        
+        self.v1 = client.CoreV1Api(api_client)
+        self.apps_v1 = client.AppsV1Api(api_client)
+        self.networking_v1 = client.NetworkingV1Api(api_client)
     
     def initialize(self):
         """Initialize Kubernetes client with fallback options"""
         if self.initialized:
             return True
+        
+        # Concurrent deploys share one client, so only the first caller loads
+        # the config and builds the connection pool
+        with self.lock:
+            if self.initialized:
+                return True
+            return self.load_config()
+    
+    def load_config(self):
+        """Load the kubeconfig, falling back to the in-cluster config"""
+        # Imported lazily: the kubernetes package is large and only needed
+        # once a deployment actually talks to the cluster
+        from kubernetes import client, config
             
         try:
             # Try loading from default kubeconfig file
@@ -29,9 +80,7 @@ class KubernetesClient:
             logger.info("Loaded Kubernetes config from kubeconfig file")
             
             # Initialize API clients
-            self.v1 = client.CoreV1Api()
-            self.apps_v1 = client.AppsV1Api()
-            self.networking_v1 = client.NetworkingV1Api()
+            self.create_api_clients(client)
             
             # Test connection
             self.apps_v1.list_namespaced_deployment(namespace="default")
@@ -45,9 +94,7 @@ class KubernetesClient:
                 config.load_incluster_config()
                 
                 # Initialize API clients
-                self.v1 = client.CoreV1Api()
-                self.apps_v1 = client.AppsV1Api()
-                self.networking_v1 = client.NetworkingV1Api()
+                self.create_api_clients(client)
                 
                 # Test connection
                 self.apps_v1.list_namespaced_deployment(namespace="default")
@@ -58,6 +105,130 @@ class KubernetesClient:
                 logger.error(f"Error initializing Kubernetes client with in-cluster config: {e}")
                 return False
     
+    def apply(self, manifest, namespace):
+        """Create or update a resource in one request using Server-Side Apply"""
+        # The generated patch methods always pick a JSON patch content type,
+        # so the apply request goes through the shared ApiClient directly
+        return self.apps_v1.api_client.call_api(
+            RESOURCE_PATHS[manifest["kind"]], "PATCH",
+            path_params={"namespace": namespace, "name": manifest["metadata"]["name"]},
+            query_params=[("fieldManager", "quickdeploy"), ("force", "true")],
+            header_params={"Accept": "application/json", "Content-Type": "application/apply-patch+yaml"},
+            body=manifest,
+            response_type="object",
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True
+        )
+    
+    def apply_all(self, manifests, namespace):
+        """Apply a batch of manifests concurrently over the shared connection pool"""
+        futures = [self.executor.submit(self.apply, manifest, namespace) for manifest in manifests]
+        # Re-raise the first failure once every request has finished
+        return [future.result() for future in futures]
+    
+    def start_watch(self, namespace):
+        """Start the background deployment watch if it is not already running"""
+        with self.deployments_changed:
+            if self.watch_thread is None:
+                self.watch_thread = threading.Thread(
+                    target=self.watch_deployments, args=(namespace,),
+                    name="k8s-watch", daemon=True
+                )
+                self.watch_thread.start()
+    
+    def watch_deployments(self, namespace):
+        """Keep deployments_by_name in sync with the cluster"""
+        from kubernetes import watch
+        from kubernetes.client.exceptions import ApiException
+        
+        resource_version = None
+        while True:
+            try:
+                if resource_version is None:
+                    # List once to fill the cache and get a version to watch from
+                    deployments = self.apps_v1.list_namespaced_deployment(namespace=namespace)
+                    for deployment in deployments.items:
+                        self.update_deployment(deployment)
+                    resource_version = deployments.metadata.resource_version
+                
+                for event in watch.Watch().stream(
+                    self.apps_v1.list_namespaced_deployment, namespace=namespace,
+                    resource_version=resource_version, timeout_seconds=300
+                ):
+                    deployment = event["object"]
+                    resource_version = deployment.metadata.resource_version
+                    if event["type"] == "DELETED":
+                        with self.deployments_changed:
+                            self.deployments_by_name.pop(deployment.metadata.name, None)
+                    else:
+                        self.update_deployment(deployment)
+            except ApiException as e:
+                if e.status == 410:
+                    # Our resourceVersion is too old to watch from, list again
+                    resource_version = None
+                else:
+                    logger.warning(f"Deployment watch error: {e}")
+                    time.sleep(5)
+            except Exception as e:
+                logger.warning(f"Deployment watch error: {e}")
+                time.sleep(5)
+    
+    def update_deployment(self, deployment):
+        with self.deployments_changed:
+            self.deployments_by_name[deployment.metadata.name] = deployment
+            self.deployments_changed.notify_all()
+    
+    def is_ready(self, app_name, generation=None):
+        """Check whether a deployment has finished rolling out, from the cache"""
+        deployment = self.deployments_by_name.get(app_name)
+        if deployment is None:
+            return False
+        
+        status = deployment.status
+        replicas = deployment.spec.replicas or 0
+        observed = status.observed_generation or 0
+        return (
+            observed >= (generation or deployment.metadata.generation)
+            and (status.updated_replicas or 0) == replicas
+            and (status.ready_replicas or 0) == replicas
+        )
+    
+    def delete(self, kind, name, namespace):
+        """Delete a resource, along with anything it owns, if it exists"""
+        from kubernetes.client.exceptions import ApiException
+        
+        try:
+            self.apps_v1.api_client.call_api(
+                RESOURCE_PATHS[kind], "DELETE",
+                path_params={"namespace": namespace, "name": name},
+                query_params=[("propagationPolicy", "Background")],
+                header_params={"Accept": "application/json"},
+                response_type="object",
+                auth_settings=["BearerToken"],
+                _return_http_data_only=True
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+    
+    def wait_for_ready(self, generations, timeout=300, namespace=K8S_NAMESPACE):
+        """
+        Block until every deployment in generations (name -> metadata.generation
+        from the object apply() returned) has finished that rollout, or until
+        timeout seconds pass. Returns the names that are still not ready.
+        """
+        if not self.initialize():
+            return list(generations)
+        self.start_watch(namespace)
+        
+        # One wait over all names, so N deployments share a single deadline
+        with self.deployments_changed:
+            self.deployments_changed.wait_for(
+                lambda: all(self.is_ready(name, generation) for name, generation in generations.items()),
+                timeout
+            )
+            return [name for name, generation in generations.items() if not self.is_ready(name, generation)]
+    
     def is_initialized(self):
         return self.initialized
 
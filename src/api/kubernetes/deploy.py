@@ -1,205 +1,272 @@
 import os
+import queue
+import secrets
 import subprocess
+import threading
 import logging
-from kubernetes import client
 from ..kubernetes.client import k8s_client
-from ..config import INGRESS_PORT, K8S_NAMESPACE
+from ..config import INGRESS_PORT, K8S_NAMESPACE, MANAGE_HOSTS_FILE
 
 logger = logging.getLogger('quickdeploy')
 
+# Static parts of the manifests, shared by every deploy
+INGRESS_ANNOTATIONS = {
+    "kubernetes.io/ingress.class": "nginx",
+    "nginx.ingress.kubernetes.io/ssl-redirect": "false"
+}
+SERVICE_PORT = 80
+
+# Seconds to wait for all of a job's deployments to become ready before failing it
+READY_TIMEOUT = 300
+# Kinds applied for every app, removed again if its rollout never becomes ready
+APP_RESOURCE_KINDS = ["Ingress", "Service", "Deployment"]
+
+def deployment_manifest(app_name, image_name, port, env_vars):
+    """Build the Deployment manifest for an app"""
+    labels = {"app": app_name}
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": app_name},
+        "spec": {
+            "replicas": 1,
+            "selector": {"matchLabels": labels},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "containers": [{
+                        "name": app_name,
+                        "image": image_name,
+                        "ports": [{"containerPort": port}],
+                        "env": env_vars
+                    }]
+                }
+            }
+        }
+    }
+
+def service_manifest(app_name, port):
+    """Build the Service manifest exposing an app's port"""
+    return {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": {"name": app_name},
+        "spec": {
+            "selector": {"app": app_name},
+            "ports": [{"port": SERVICE_PORT, "targetPort": port}]
+        }
+    }
+
+def ingress_manifest(app_name):
+    """Build the Ingress manifest routing an app's host name to its service"""
+    # Note: Docker Desktop Kubernetes uses a different structure for ingress
+    return {
+        "apiVersion": "networking.k8s.io/v1",
+        "kind": "Ingress",
+        "metadata": {"name": app_name, "annotations": INGRESS_ANNOTATIONS},
+        "spec": {
+            "rules": [{
+                "host": f"{app_name}.quickdeploy.local",
+                "http": {
+                    "paths": [{
+                        "path": "/",
+                        "pathType": "Prefix",
+                        "backend": {
+                            "service": {"name": app_name, "port": {"number": SERVICE_PORT}}
+                        }
+                    }]
+                }
+            }]
+        }
+    }
+
+# Host names already in /etc/hosts, read once and kept up to date as entries are added
+known_hosts = None
+
+def load_known_hosts():
+    """Read the set of host names mapped in /etc/hosts"""
+    hosts = set()
+    try:
+        with open('/etc/hosts', 'r') as hosts_file:
+            for line in hosts_file:
+                # Everything after the address on a line is a host name or alias
+                hosts.update(line.split('#', 1)[0].split()[1:])
+    except Exception as e:
+        logger.warning(f"Could not read /etc/hosts: {e}")
+    return hosts
+
+# Host names waiting to be appended to /etc/hosts by the writer thread
+pending_hosts = queue.Queue()
+hosts_writer = None
+# Guards known_hosts and hosts_writer, which deploy threads and the writer share
+hosts_lock = threading.Lock()
+
+# How long the writer waits for more host names before running sudo for a batch
+HOSTS_BATCH_DELAY = 0.5
+
+def add_hosts_entry(host_name):
+    """Queue host_name for /etc/hosts if it doesn't already exist"""
+    global known_hosts, hosts_writer
+    with hosts_lock:
+        if known_hosts is None:
+            known_hosts = load_known_hosts()
+        
+        # Exact name match, so app-123 is not mistaken for app-1234
+        if host_name in known_hosts:
+            return
+        known_hosts.add(host_name)
+        pending_hosts.put(host_name)
+        
+        if hosts_writer is None:
+            hosts_writer = threading.Thread(target=write_hosts_entries, name="hosts-writer", daemon=True)
+            hosts_writer.start()
+
+def write_hosts_entries():
+    """Append queued host names to /etc/hosts, one sudo call per batch"""
+    while True:
+        batch = [pending_hosts.get()]
+        try:
+            while True:
+                batch.append(pending_hosts.get(timeout=HOSTS_BATCH_DELAY))
+        except queue.Empty:
+            pass
+        
+        try:
+            # Need to use sudo to write to /etc/hosts
+            logger.info(f"Adding {', '.join(batch)} to /etc/hosts")
+            subprocess.run(
+                ["sudo", "tee", "-a", "/etc/hosts"],
+                input="".join(f"127.0.0.1 {host_name}\n" for host_name in batch), text=True,
+                stdout=subprocess.DEVNULL, check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            # Forget the names so a later deploy tries to add them again
+            with hosts_lock:
+                known_hosts.difference_update(batch)
+            logger.warning(f"Could not add {', '.join(batch)} to /etc/hosts: {e}")
+            logger.warning("You may need to manually add it or run as administrator")
+
 def deploy_to_kubernetes(image_name, deployment_id, project_type, port, db_info=None, service_env=None):
-    """Deploy the application to Kubernetes"""
-    # Check if Kubernetes is initialized
-    if not k8s_client.is_initialized():
-        if not k8s_client.initialize():
-            logger.error("Kubernetes clients not initialized")
-            return None
+    """
+    Deploy the application to Kubernetes. Returns the app's URL and the
+    generation of the applied Deployment, to pass to wait_for_deployments
+    """
+    # Initialize Kubernetes once per process; later calls return immediately
+    if not k8s_client.initialize():
+        logger.error("Kubernetes clients not initialized")
+        return None
+    apply_all = k8s_client.apply_all
     
     app_name = f"app-{deployment_id}"
     namespace = K8S_NAMESPACE
     
     try:
-        # Try to delete existing resources if they exist
-        try:
-            # Check if deployment exists before trying to delete
-            k8s_client.apps_v1.read_namespaced_deployment(name=app_name, namespace=namespace)
-            logger.info(f"Deleting existing deployment: {app_name}")
-            k8s_client.apps_v1.delete_namespaced_deployment(name=app_name, namespace=namespace)
-        except client.exceptions.ApiException as e:
-            if e.status != 404:  # Only log if not a "not found" error
-                logger.warning(f"Error checking deployment: {e}")
-        
-        try:
-            # Check if service exists
-            k8s_client.v1.read_namespaced_service(name=app_name, namespace=namespace)
-            logger.info(f"Deleting existing service: {app_name}")
-            k8s_client.v1.delete_namespaced_service(name=app_name, namespace=namespace)
-        except client.exceptions.ApiException as e:
-            if e.status != 404:
-                logger.warning(f"Error checking service: {e}")
-        
-        try:
-            # Check if ingress exists
-            k8s_client.networking_v1.read_namespaced_ingress(name=app_name, namespace=namespace)
-            logger.info(f"Deleting existing ingress: {app_name}")
-            k8s_client.networking_v1.delete_namespaced_ingress(name=app_name, namespace=namespace)
-        except client.exceptions.ApiException as e:
-            if e.status != 404:
-                logger.warning(f"Error checking ingress: {e}")
-        
         # Add environment variables for database if provided
         env_vars = []
         if db_info:
             logger.info(f"Adding database environment variables for {db_info['type']}")
             if db_info["type"] == "postgres":
                 env_vars = [
-                    client.V1EnvVar(name="DATABASE_URL", value=db_info["url"]),
-                    client.V1EnvVar(name="DB_HOST", value=db_info["host"]),
-                    client.V1EnvVar(name="DB_PORT", value=str(db_info["port"])),
-                    client.V1EnvVar(name="DB_NAME", value=db_info["database"]),
-                    client.V1EnvVar(name="DB_USER", value=db_info["username"]),
-                    client.V1EnvVar(name="DB_PASSWORD", value=db_info["password"])
+                    {"name": "DATABASE_URL", "value": db_info["url"]},
+                    {"name": "DB_HOST", "value": db_info["host"]},
+                    {"name": "DB_PORT", "value": str(db_info["port"])},
+                    {"name": "DB_NAME", "value": db_info["database"]},
+                    {"name": "DB_USER", "value": db_info["username"]},
+                    {"name": "DB_PASSWORD", "value": db_info["password"]}
                 ]
         
         # Add service environment variables if provided
         if service_env:
             for key, value in service_env.items():
-                env_vars.append(client.V1EnvVar(name=key, value=value))
-        
-        # Create container
-        container = client.V1Container(
-            name=app_name,
-            image=image_name,
-            ports=[client.V1ContainerPort(container_port=port)],
-            env=env_vars
-        )
-        
-        # Create deployment
-        deployment = client.V1Deployment(
-            metadata=client.V1ObjectMeta(name=app_name),
-            spec=client.V1DeploymentSpec(
-                replicas=1,
-                selector=client.V1LabelSelector(
-                    match_labels={"app": app_name}
-                ),
-                template=client.V1PodTemplateSpec(
-                    metadata=client.V1ObjectMeta(
-                        labels={"app": app_name}
-                    ),
-                    spec=client.V1PodSpec(
-                        containers=[container]
-                    )
-                )
-            )
-        )
-        
-        logger.info(f"Creating deployment: {app_name}")
-        k8s_client.apps_v1.create_namespaced_deployment(namespace=namespace, body=deployment)
-        
-        # Create service
-        service = client.V1Service(
-            metadata=client.V1ObjectMeta(name=app_name),
-            spec=client.V1ServiceSpec(
-                selector={"app": app_name},
-                ports=[client.V1ServicePort(port=80, target_port=port)]
-            )
-        )
+                env_vars.append({"name": key, "value": value})
         
-        logger.info(f"Creating service: {app_name}")
-        k8s_client.v1.create_namespaced_service(namespace=namespace, body=service)
+        deployment = deployment_manifest(app_name, image_name, port, env_vars)
+        service = service_manifest(app_name, port)
+        ingress = ingress_manifest(app_name)
         
-        # Create ingress
-        # Note: Docker Desktop Kubernetes uses a different structure for ingress
-        ingress = client.V1Ingress(
-            metadata=client.V1ObjectMeta(
-                name=app_name,
-                annotations={
-                    "kubernetes.io/ingress.class": "nginx",
-                    "nginx.ingress.kubernetes.io/ssl-redirect": "false"
-                }
-            ),
-            spec=client.V1IngressSpec(
-                rules=[
-                    client.V1IngressRule(
-                        host=f"{app_name}.quickdeploy.local",
-                        http=client.V1HTTPIngressRuleValue(
-                            paths=[
-                                client.V1HTTPIngressPath(
-                                    path="/",
-                                    path_type="Prefix",
-                                    backend=client.V1IngressBackend(
-                                        service=client.V1IngressServiceBackend(
-                                            name=app_name,
-                                            port=client.V1ServiceBackendPort(
-                                                number=80
-                                            )
-                                        )
-                                    )
-                                )
-                            ]
-                        )
-                    )
-                ]
-            )
-        )
+        # Apply the deployment, service and ingress as one concurrent batch.
+        # Server-Side Apply creates missing resources and updates existing
+        # ones in place, so unchanged pods are not restarted
+        logger.info(f"Applying deployment, service and ingress: {app_name}")
+        applied_deployment, _, _ = apply_all([deployment, service, ingress], namespace)
         
-        logger.info(f"Creating ingress: {app_name}")
-        k8s_client.networking_v1.create_namespaced_ingress(namespace=namespace, body=ingress)
-        
-        # Add to /etc/hosts if it doesn't already exist
+        # Make the host name resolvable locally
         host_name = f"{app_name}.quickdeploy.local"
-        add_to_hosts = True
+        if MANAGE_HOSTS_FILE:
+            add_hosts_entry(host_name)
         
-        try:
-            with open('/etc/hosts', 'r') as hosts_file:
-                if host_name in hosts_file.read():
-                    add_to_hosts = False
-        except Exception as e:
-            logger.warning(f"Could not read /etc/hosts: {e}")
-        
-        if add_to_hosts:
-            try:
-                # Need to use sudo to write to /etc/hosts
-                command = f"echo '127.0.0.1 {host_name}' | sudo tee -a /etc/hosts > /dev/null"
-                logger.info(f"Adding {host_name} to /etc/hosts")
-                subprocess.run(command, shell=True, check=True)
-            except subprocess.CalledProcessError as e:
-                logger.warning(f"Could not add {host_name} to /etc/hosts: {e}")
-                logger.warning("You may need to manually add it or run as administrator")
-        
-        logger.info(f"Deployment successful: http://{host_name}")
-        return f"http://{host_name}"
+        logger.info(f"Deployment applied: http://{host_name}")
+        return f"http://{host_name}", applied_deployment["metadata"]["generation"]
     except Exception as e:
         logger.error(f"Kubernetes deployment error: {e}")
         return None
 
+def wait_for_deployments(generations):
+    """
+    Wait for the rollouts of a job's deployments (app name -> generation) to
+    become ready together. If any don't within READY_TIMEOUT, every app in
+    generations is deleted again, since the job is failed as a whole
+    """
+    namespace = K8S_NAMESPACE
+    try:
+        not_ready = k8s_client.wait_for_ready(generations, READY_TIMEOUT, namespace)
+    except Exception as e:
+        logger.error(f"Error waiting for deployments: {e}")
+        not_ready = list(generations)
+    if not not_ready:
+        return True
+    
+    logger.error(f"Deployments {', '.join(not_ready)} did not become ready within {READY_TIMEOUT}s")
+    for app_name in generations:
+        try:
+            logger.info(f"Removing resources for {app_name}")
+            for kind in APP_RESOURCE_KINDS:
+                k8s_client.delete(kind, app_name, namespace)
+        except Exception as e:
+            logger.warning(f"Could not remove resources for {app_name}, they may still be running: {e}")
+    return False
+
+docker_client = None
+docker_client_lock = threading.Lock()
+
+def get_docker():
+    """Get a shared Docker API client, connecting on first use"""
+    global docker_client
+    if docker_client is None:
+        # Databases are provisioned concurrently, so only the first caller connects
+        with docker_client_lock:
+            if docker_client is None:
+                # Imported lazily like kubernetes, only database provisioning needs it
+                import docker
+                docker_client = docker.from_env()
+    return docker_client
+
 def provision_database(db_type, db_version, app_name):
     """Create a database container for the application"""
     try:
         if db_type == "postgres":
-            # Generate random password
-            import random
-            import string
-            password = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(16))
+            # Generate a random password; URL-safe so it can go straight into DATABASE_URL
+            password = secrets.token_urlsafe(16)
             
             # Create PostgreSQL container
             container_name = f"{app_name}-postgres"
             logger.info(f"Creating PostgreSQL container: {container_name}")
             
-            subprocess.run([
-                "docker", "run", "-d",
-                "--name", container_name,
-                "-e", f"POSTGRES_PASSWORD={password}",
-                "-e", f"POSTGRES_USER=quickdeploy",
-                "-e", f"POSTGRES_DB=app",
-                f"postgres:{db_version}-alpine"
-            ], check=True)
+            container = get_docker().containers.run(
+                f"postgres:{db_version}-alpine",
+                name=container_name,
+                detach=True,
+                environment={
+                    "POSTGRES_PASSWORD": password,
+                    "POSTGRES_USER": "quickdeploy",
+                    "POSTGRES_DB": "app"
+                }
+            )
             
             # Get container IP
-            container_ip = subprocess.run(
-                ["docker", "inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}", container_name],
-                capture_output=True, text=True, check=True
-            ).stdout.strip()
+            container.reload()
+            networks = container.attrs["NetworkSettings"]["Networks"]
+            container_ip = "".join(network["IPAddress"] for network in networks.values())
             
             logger.info(f"PostgreSQL container IP: {container_ip}")
             
@@ -1,131 +1,69 @@
 import os
+import re
+import hashlib
+import string
+from pathlib import Path
 import subprocess
 import logging
 from ..detection.port import detect_port
-from ..config import DOCKER_REGISTRY
+from ..config import DOCKER_REGISTRY, BUILDX_BUILDER
 from ..utils.files import write_env_file
-import json
+from ..utils.process import run_streamed
+import orjson
 
 logger = logging.getLogger('quickdeploy')
 
-def build_project(project_type, project_dir, repo_dir, deployment_id, env=None):
-    """Build project based on type with environment variables support"""
-    try:
-        port = detect_port(project_type, project_dir)
-        env = env or {}  # Ensure env is a dictionary even if None is passed
+# Dockerfile and start script templates, rendered per build with the detected port
+NEXTJS_DOCKERFILE = string.Template("""FROM node:20-alpine AS build
+WORKDIR /app
+COPY package*.json ./
+RUN if [ -f package-lock.json ]; then npm ci; else npm install; fi
+COPY . .
+RUN npm run build && npm prune --omit=dev
 
-        if project_type == "nextjs":
-            # For Next.js, use .env.production
-            env_file = os.path.join(project_dir, ".env.production")
-            # Filter for Next.js relevant environment variables
-            next_env = {k: v for k, v in env.items() if k.startswith("NEXT_") or k.startswith("NEXT_PUBLIC_")}
-            write_env_file(env_file, next_env)
-
-            logger.info("Building Next.js project...")
-            subprocess.run(["npm", "install"], cwd=project_dir, check=True)
-            subprocess.run(["npm", "run", "build"], cwd=project_dir, check=True)
-            
-            # Create Dockerfile for Next.js
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
 FROM node:20-alpine
 WORKDIR /app
-COPY package.json package-lock.json ./
-RUN npm install --production
-COPY .env.production ./
-COPY .next ./.next
-COPY public ./public
-COPY node_modules ./node_modules
+COPY --from=build /app/package*.json ./
+COPY --from=build /app/.env.production ./
+COPY --from=build /app/.next ./.next
+COPY --from=build /app/public ./public
+COPY --from=build /app/node_modules ./node_modules
 
 # Expose the detected port
-EXPOSE {port}
+EXPOSE ${port}
 
 CMD ["npm", "start"]
-                """)
-                
-        elif project_type == "react":
-            # For React, use .env
-            env_file = os.path.join(project_dir, ".env")
-            # Filter for React relevant environment variables
-            react_env = {k: v for k, v in env.items() if k.startswith("REACT_APP_")}
-            write_env_file(env_file, react_env)
-
-            logger.info("Building React project...")
-            subprocess.run(["npm", "install"], cwd=project_dir, check=True)
-            subprocess.run(["npm", "run", "build"], cwd=project_dir, check=True)
-            
-            # Create Dockerfile for React - Since React is built at build time, no need to include env vars
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
-FROM nginx:alpine
-COPY build /usr/share/nginx/html
+""")
 
-# Configure nginx to handle SPA routing
-RUN echo 'server {{\\n\\
-    listen {port};\\n\\
-    root /usr/share/nginx/html;\\n\\
-    location / {{\\n\\
-        try_files $uri $uri/ /index.html;\\n\\
-    }}\\n\\
-}}' > /etc/nginx/conf.d/default.conf
+SPA_DOCKERFILE = string.Template("""FROM node:20-alpine AS build
+WORKDIR /app
+COPY package*.json ./
+RUN if [ -f package-lock.json ]; then npm ci; else npm install; fi
+COPY . .
+RUN npm run build
 
-EXPOSE {port}
-CMD ["nginx", "-g", "daemon off;"]
-                """)
-                
-        elif project_type == "vue":
-            # For Vue, use .env.production
-            env_file = os.path.join(project_dir, ".env.production")
-            # Filter for Vue relevant environment variables
-            vue_env = {k: v for k, v in env.items() if k.startswith("VUE_APP_")}
-            write_env_file(env_file, vue_env)
-
-            logger.info("Building Vue project...")
-            subprocess.run(["npm", "install"], cwd=project_dir, check=True)
-            subprocess.run(["npm", "run", "build"], cwd=project_dir, check=True)
-            
-            # Create Dockerfile for Vue
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
 FROM nginx:alpine
-COPY dist /usr/share/nginx/html
+COPY --from=build /app/${build_dir} /usr/share/nginx/html
 
 # Configure nginx to handle SPA routing
-RUN echo 'server {{\\n\\
-    listen {port};\\n\\
+RUN echo 'server {\\n\\
+    listen ${port};\\n\\
     root /usr/share/nginx/html;\\n\\
-    location / {{\\n\\
-        try_files $uri $uri/ /index.html;\\n\\
-    }}\\n\\
-}}' > /etc/nginx/conf.d/default.conf
+    location / {\\n\\
+        try_files $$uri $$uri/ /index.html;\\n\\
+    }\\n\\
+}' > /etc/nginx/conf.d/default.conf
 
-EXPOSE {port}
+EXPOSE ${port}
 CMD ["nginx", "-g", "daemon off;"]
-                """)
-                
-        elif project_type == "flask":
-            logger.info("Building Flask project...")
-            # Create virtual environment
-            subprocess.run(["python3", "-m", "venv", "venv"], cwd=project_dir, check=True)
-            
-            # Install requirements
-            if os.name == 'nt':  # Windows
-                pip_path = os.path.join(project_dir, "venv", "Scripts", "pip")
-            else:  # Unix-like
-                pip_path = os.path.join(project_dir, "venv", "bin", "pip")
-                
-            subprocess.run([pip_path, "install", "-r", "requirements.txt"], cwd=project_dir, check=True)
-            
-            # Create a simple Python script to load environment variables at container startup
-            with open(os.path.join(project_dir, "start.sh"), "w") as f:
-                f.write(f"""#!/bin/bash
+""")
+
+FLASK_START_SCRIPT = string.Template("""#!/bin/bash
 # Start gunicorn with environment variables
-gunicorn --bind 0.0.0.0:{port} app:app
+gunicorn --bind 0.0.0.0:${port} app:app
 """)
-                
-            # Create Dockerfile for Flask - Environment variables will be passed via Kubernetes
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
+
+FLASK_DOCKERFILE = string.Template("""# syntax=docker/dockerfile:1.6
 FROM python:3.9-slim
 WORKDIR /app
 
@@ -135,57 +73,30 @@ RUN apt-get update && apt-get install -y \\
     libpq-dev \\
     python3-dev
 
-# Copy requirements and install Python dependencies
+# Copy requirements and install Python dependencies, reusing downloaded
+# wheels from the BuildKit cache across builds
 COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
-RUN pip install gunicorn
+RUN --mount=type=cache,target=/root/.cache/pip pip install -r requirements.txt gunicorn
 
 # Copy application code
 COPY . .
 
-# Make startup script executable
-RUN chmod +x start.sh
-
 # Expose the detected port
-EXPOSE {port}
+EXPOSE ${port}
 
 # Run with gunicorn
 CMD ["./start.sh"]
-                """)
-                
-        elif project_type == "django":
-            logger.info("Building Django project...")
-            # Create virtual environment
-            subprocess.run(["python3", "-m", "venv", "venv"], cwd=project_dir, check=True)
-            
-            # Install requirements
-            if os.name == 'nt':  # Windows
-                pip_path = os.path.join(project_dir, "venv", "Scripts", "pip")
-            else:  # Unix-like
-                pip_path = os.path.join(project_dir, "venv", "bin", "pip")
-                
-            subprocess.run([pip_path, "install", "-r", "requirements.txt"], cwd=project_dir, check=True)
-            
-            # Detect Django project name
-            django_project = "project"  # Default project name
-            for item in os.listdir(project_dir):
-                if os.path.isdir(os.path.join(project_dir, item)) and os.path.exists(os.path.join(project_dir, item, 'settings.py')):
-                    django_project = item
-                    break
-            
-            # Create start script
-            with open(os.path.join(project_dir, "start.sh"), "w") as f:
-                f.write(f"""#!/bin/bash
+""")
+
+DJANGO_START_SCRIPT = string.Template("""#!/bin/bash
 # Apply migrations
 python manage.py migrate
 
 # Start gunicorn
-gunicorn --bind 0.0.0.0:{port} {django_project}.wsgi:application
+gunicorn --bind 0.0.0.0:${port} ${django_project}.wsgi:application
 """)
-            
-            # Create Dockerfile for Django - Environment variables will be passed via Kubernetes
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
+
+DJANGO_DOCKERFILE = string.Template("""# syntax=docker/dockerfile:1.6
 FROM python:3.9-slim
 WORKDIR /app
 
@@ -195,87 +106,207 @@ RUN apt-get update && apt-get install -y \\
     libpq-dev \\
     python3-dev
 
-# Copy requirements and install Python dependencies
+# Copy requirements and install Python dependencies, reusing downloaded
+# wheels from the BuildKit cache across builds
 COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
-RUN pip install gunicorn
+RUN --mount=type=cache,target=/root/.cache/pip pip install -r requirements.txt gunicorn
 
 # Copy application code
 COPY . .
 
-# Make startup script executable
-RUN chmod +x start.sh
-
 # Expose the detected port
-EXPOSE {port}
+EXPOSE ${port}
 
 # Run with gunicorn
 CMD ["./start.sh"]
-                """)
-                
-        elif project_type == "nodejs" or project_type == "express":
-            # For Node.js/Express, use .env
-            env_file = os.path.join(project_dir, ".env")
-            write_env_file(env_file, env)
-
-            logger.info("Building Node.js project...")
-            subprocess.run(["npm", "install"], cwd=project_dir, check=True)
-            
-            # Try to determine the entry point
-            entry_point = "app.js"  # Default
-            package_json_path = os.path.join(project_dir, "package.json")
-            if os.path.exists(package_json_path):
-                with open(package_json_path, 'r') as f:
-                    package_data = json.load(f)
-                    if "main" in package_data:
-                        entry_point = package_data["main"]
-            
-            # Create startup script that loads environment variables
-            with open(os.path.join(project_dir, "start.sh"), "w") as f:
-                f.write(f"""#!/bin/sh
+""")
+
+NODE_START_SCRIPT = string.Template("""#!/bin/sh
 # Start Node.js application
-node {entry_point}
+node ${entry_point}
 """)
-                
-            # Create Dockerfile for Node.js
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
-FROM node:20-alpine
+
+NODE_DOCKERFILE = string.Template("""FROM node:20-alpine
 WORKDIR /app
 COPY package*.json ./
 RUN npm install
 COPY . .
-RUN chmod +x start.sh
 
 # Expose the detected port
-EXPOSE {port}
+EXPOSE ${port}
 
 CMD ["./start.sh"]
-                """)
-                
-        else:
-            logger.info("Using generic Nginx container for unknown project type")
-            # Generic fallback
-            with open(os.path.join(project_dir, "Dockerfile"), "w") as f:
-                f.write(f"""
-FROM nginx:alpine
+""")
+
+STATIC_DOCKERFILE = string.Template("""FROM nginx:alpine
 COPY . /usr/share/nginx/html
-EXPOSE {port}
+EXPOSE ${port}
 CMD ["nginx", "-g", "daemon off;"]
-                """)
+""")
+
+def write_start_script(project_dir, script):
+    """Write an executable start.sh into the project"""
+    path = Path(project_dir, "start.sh")
+    # Written as bytes so the script keeps LF line endings on every host
+    path.write_bytes(script.encode())
+    # COPY keeps the mode bits, so the image needs no chmod layer
+    path.chmod(0o755)
+
+def build_nextjs(project_dir, port, env):
+    # For Next.js, use .env.production
+    env_file = os.path.join(project_dir, ".env.production")
+    # Filter for Next.js relevant environment variables
+    next_env = {k: v for k, v in env.items() if k.startswith("NEXT_") or k.startswith("NEXT_PUBLIC_")}
+    write_env_file(env_file, next_env)
+
+    logger.info("Building Next.js project...")
+    
+    # Create Dockerfile for Next.js - dependencies are installed and built inside Docker
+    Path(project_dir, "Dockerfile").write_text(NEXTJS_DOCKERFILE.substitute(port=port))
+
+def build_react(project_dir, port, env):
+    # For React, use .env
+    env_file = os.path.join(project_dir, ".env")
+    # Filter for React relevant environment variables
+    react_env = {k: v for k, v in env.items() if k.startswith("REACT_APP_")}
+    write_env_file(env_file, react_env)
+
+    logger.info("Building React project...")
+    
+    # Create Dockerfile for React - Since React is built at build time, no need to include env vars
+    Path(project_dir, "Dockerfile").write_text(SPA_DOCKERFILE.substitute(port=port, build_dir="build"))
+
+def build_vue(project_dir, port, env):
+    # For Vue, use .env.production
+    env_file = os.path.join(project_dir, ".env.production")
+    # Filter for Vue relevant environment variables
+    vue_env = {k: v for k, v in env.items() if k.startswith("VUE_APP_")}
+    write_env_file(env_file, vue_env)
+
+    logger.info("Building Vue project...")
+    
+    # Create Dockerfile for Vue
+    Path(project_dir, "Dockerfile").write_text(SPA_DOCKERFILE.substitute(port=port, build_dir="dist"))
+
+def build_flask(project_dir, port, env):
+    logger.info("Building Flask project...")
+    
+    # Create a simple Python script to load environment variables at container startup
+    write_start_script(project_dir, FLASK_START_SCRIPT.substitute(port=port))
+    
+    # Create Dockerfile for Flask - Environment variables will be passed via Kubernetes
+    Path(project_dir, "Dockerfile").write_text(FLASK_DOCKERFILE.substitute(port=port))
+
+def build_django(project_dir, port, env):
+    logger.info("Building Django project...")
+    
+    # Detect Django project name
+    django_project = "project"  # Default project name
+    for item in os.listdir(project_dir):
+        if os.path.isdir(os.path.join(project_dir, item)) and os.path.exists(os.path.join(project_dir, item, 'settings.py')):
+            django_project = item
+            break
+    
+    # Create start script
+    write_start_script(project_dir, DJANGO_START_SCRIPT.substitute(port=port, django_project=django_project))
+    
+    # Create Dockerfile for Django - Environment variables will be passed via Kubernetes
+    Path(project_dir, "Dockerfile").write_text(DJANGO_DOCKERFILE.substitute(port=port))
+
+def build_nodejs(project_dir, port, env):
+    # For Node.js/Express, use .env
+    env_file = os.path.join(project_dir, ".env")
+    write_env_file(env_file, env)
+
+    logger.info("Building Node.js project...")
+    
+    # Try to determine the entry point
+    entry_point = "app.js"  # Default
+    package_json_path = Path(project_dir, "package.json")
+    if package_json_path.exists():
+        raw = package_json_path.read_bytes()
+        # Only parse package.json when it can actually contain a "main" field
+        if b'"main"' in raw:
+            entry_point = orjson.loads(raw).get("main", entry_point)
+    
+    # Create startup script that loads environment variables
+    write_start_script(project_dir, NODE_START_SCRIPT.substitute(entry_point=entry_point))
+    
+    # Create Dockerfile for Node.js
+    Path(project_dir, "Dockerfile").write_text(NODE_DOCKERFILE.substitute(port=port))
+
+def build_static(project_dir, port, env):
+    logger.info("Using generic Nginx container for unknown project type")
+    # Generic fallback
+    Path(project_dir, "Dockerfile").write_text(STATIC_DOCKERFILE.substitute(port=port))
+
+# Prepares the build context for each project type; anything else is served as static files
+PROJECT_HANDLERS = {
+    "nextjs": build_nextjs,
+    "react": build_react,
+    "vue": build_vue,
+    "flask": build_flask,
+    "django": build_django,
+    "nodejs": build_nodejs,
+    "express": build_nodejs,
+}
+
+# First port a project's own Dockerfile exposes, which the Kubernetes service targets
+DOCKERFILE_EXPOSE_RE = re.compile(rb'^\s*EXPOSE\s+(\d+)', re.IGNORECASE | re.MULTILINE)
+
+# Runs of characters that are not allowed in a Docker tag
+TAG_UNSAFE_RE = re.compile(r'[^a-z0-9]+')
+
+def build_cache_key(repo_url, service_name):
+    """
+    Registry cache tag for a service of a repository. It stays the same across
+    deploys, so each build reuses the previous deploy's layers and overwrites
+    the same tag instead of leaving a new one behind every time.
+    """
+    slug = TAG_UNSAFE_RE.sub('-', repo_url.lower().rstrip('/').removesuffix('.git')).strip('-')
+    # Short hash keeps URLs whose slugs collide or get truncated apart
+    digest = hashlib.sha1(repo_url.encode()).hexdigest()[:10]
+    service = TAG_UNSAFE_RE.sub('-', service_name.lower()).strip('-')
+    return f"{slug[-60:].lstrip('-')}-{digest}-{service[:40]}"
+
+def build_project(project_type, project_dir, repo_dir, deployment_id, env=None, cache_key=None):
+    """
+    Build project based on type with environment variables support
+    - cache_key: Registry cache tag shared by builds of the same service, see
+      build_cache_key; defaults to deployment_id, which only caches within a deploy
+    """
+    try:
+        port = detect_port(project_type, project_dir)
+        env = env or {}  # Ensure env is a dictionary even if None is passed
+
+        dockerfile = Path(project_dir, "Dockerfile")
+        if dockerfile.is_file():
+            # The repository knows best how to build itself, use its Dockerfile as is
+            logger.info("Using the project's own Dockerfile")
+            expose = DOCKERFILE_EXPOSE_RE.search(dockerfile.read_bytes())
+            if expose:
+                port = int(expose.group(1))
+        else:
+            handler = PROJECT_HANDLERS.get(project_type, build_static)
+            handler(project_dir, port, env)
         
         # Build Docker image
         image_name = f"{DOCKER_REGISTRY}/quickdeploy-{deployment_id}:latest"
         
-        # Build with docker
-        build_cmd = ["docker", "build", "-t", image_name, "."]
-        logger.info(f"Running build command: {' '.join(build_cmd)}")
-        subprocess.run(build_cmd, cwd=project_dir, check=True)
+        # Layers are cached in the registry so rebuilds only send what changed
+        cache_ref = f"{DOCKER_REGISTRY}/quickdeploy-cache:{cache_key or deployment_id}"
         
-        # Push to local registry
-        push_cmd = ["docker", "push", image_name]
-        logger.info(f"Running push command: {' '.join(push_cmd)}")
-        subprocess.run(push_cmd, check=True)
+        # Build and push in one step with buildx
+        build_cmd = [
+            "docker", "buildx", "build", "--builder", BUILDX_BUILDER,
+            f"--cache-from=type=registry,ref={cache_ref}",
+            f"--cache-to=type=registry,mode=max,ref={cache_ref}",
+            # Line-oriented output suits run_streamed's per-line logging
+            "--progress=plain", "--push", "-t", image_name, "."
+        ]
+        logger.info(f"Running build command: {' '.join(build_cmd)}")
+        # BuildKit runs independent stages in parallel and caches each layer
+        run_streamed(build_cmd, cwd=project_dir, env={**os.environ, "DOCKER_BUILDKIT": "1"})
         
         logger.info(f"Successfully built and pushed image: {image_name}")
         return image_name, port
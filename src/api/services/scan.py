@@ -2,12 +2,22 @@ import os
 import logging
 import json
 from ..config import INGRESS_PORT, FRONTEND_TYPES, BACKEND_TYPES, SKIP_DIRECTORIES
-from ..detection.project import detect_project_type, detect_default_port
+from ..detection.project import detect_project_type, detect_project_type_from_entries, detect_default_port
 import yaml
 import re
 
 logger = logging.getLogger('quickdeploy')
 
+# libyaml-backed safe loader when available, pure Python otherwise
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Environment variable each frontend type reads its backend API URL from
+API_URL_VARIABLES = {
+    "nextjs": "NEXT_PUBLIC_API_URL",
+    "react": "REACT_APP_API_URL",
+    "vue": "VUE_APP_API_URL"
+}
+
 def scan_repository(temp_dir):
     """
     Scan a repository for deployable services using a three-step approach:
@@ -48,20 +58,29 @@ def scan_repository_from_config(temp_dir):
     services = []
     config_path = os.path.join(temp_dir, "quickdeploy.yaml")
     
-    if not os.path.exists(config_path):
+    try:
+        # Open directly rather than checking for the file first
+        with open(config_path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        logger.error(f"Error reading quickdeploy.yaml: {e}")
         return []
         
     try:
-        
-        with open(config_path) as f:
-            config = yaml.safe_load(f)
+        # A config without a services key yields nothing, so skip parsing it
+        if b"services" not in raw:
+            return []
+        config = yaml.load(raw, Loader=YAML_LOADER)
             
         if not config or "services" not in config:
             return []
             
         for service_name, service_config in config["services"].items():
             service_path = service_config.get("path", ".")
-            absolute_path = os.path.join(temp_dir, service_path)
+            # Normalized so "." and "./web" style paths share detection cache entries
+            absolute_path = os.path.realpath(os.path.join(temp_dir, service_path))
             service_type = service_config.get("type", "auto")
             
             # Auto-detect type if set to "auto"
@@ -91,32 +110,29 @@ def scan_repository_from_config(temp_dir):
             frontends = [s for s in services if s["service_role"] == "frontend"]
             backends = [s for s in services if s["service_role"] == "backend"]
             
+            # Names of the variables each service already defines, for O(1) duplicate checks
+            env_keys = {s["name"]: {e.split("=", 1)[0] for e in s["env"]} for s in services}
+            
             # Connect frontends to backends with proper environment variables
             for frontend in frontends:
+                frontend_keys = env_keys[frontend["name"]]
+                api_url_key = API_URL_VARIABLES.get(frontend["type"], "VUE_APP_API_URL")
                 for backend in backends:
                     if "connections" not in frontend or backend["name"] in frontend["connections"]:
                         # Add environment variable for API URL if not already defined
-                        if frontend["type"] == "nextjs":
-                            env_var = f"NEXT_PUBLIC_API_URL=http://{backend['name']}.quickdeploy.local:{INGRESS_PORT}"
-                            if not any(e.startswith("NEXT_PUBLIC_API_URL=") for e in frontend["env"]):
-                                frontend["env"].append(env_var)
-                        elif frontend["type"] == "react":
-                            env_var = f"REACT_APP_API_URL=http://{backend['name']}.quickdeploy.local:{INGRESS_PORT}"
-                            if not any(e.startswith("REACT_APP_API_URL=") for e in frontend["env"]):
-                                frontend["env"].append(env_var)
-                        else:  # Vue
-                            env_var = f"VUE_APP_API_URL=http://{backend['name']}.quickdeploy.local:{INGRESS_PORT}"
-                            if not any(e.startswith("VUE_APP_API_URL=") for e in frontend["env"]):
-                                frontend["env"].append(env_var)
+                        if api_url_key not in frontend_keys:
+                            frontend["env"].append(f"{api_url_key}=http://{backend['name']}.quickdeploy.local:{INGRESS_PORT}")
+                            frontend_keys.add(api_url_key)
                                 
                         # Add CORS environment variable to backend if not already defined
-                        if backend["type"] in BACKEND_TYPES:
-                            env_var = f"CORS_ORIGIN=http://{frontend['name']}.quickdeploy.local:{INGRESS_PORT}"
-                            if not any(e.startswith("CORS_ORIGIN=") for e in backend["env"]):
-                                backend["env"].append(env_var)
+                        backend_keys = env_keys[backend["name"]]
+                        if backend["type"] in BACKEND_TYPES and "CORS_ORIGIN" not in backend_keys:
+                            backend["env"].append(f"CORS_ORIGIN=http://{frontend['name']}.quickdeploy.local:{INGRESS_PORT}")
+                            backend_keys.add("CORS_ORIGIN")
             
         # If database configuration exists, attach to appropriate services
         if "databases" in config:
+            services_by_name = {service["name"]: service for service in services}
             for db_name, db_config in config["databases"].items():
                 db_info = {
                     "type": db_config.get("type", "postgres"),
@@ -124,20 +140,11 @@ def scan_repository_from_config(temp_dir):
                     "name": db_name
                 }
                 
-                # Attach to specific services if specified
-                if "services" in db_config:
-                    for service_name in db_config["services"]:
-                        for service in services:
-                            if service["name"] == service_name:
-                                if "databases" not in service:
-                                    service["databases"] = []
-                                service["databases"].append(db_info)
-                # Otherwise attach to all services
-                else:
-                    for service in services:
-                        if "databases" not in service:
-                            service["databases"] = []
-                        service["databases"].append(db_info)
+                # Attach to specific services if specified, otherwise to all services
+                for service_name in db_config.get("services", services_by_name):
+                    service = services_by_name.get(service_name)
+                    if service is not None:
+                        service.setdefault("databases", []).append(db_info)
                         
     except Exception as e:
         logger.error(f"Error parsing quickdeploy.yaml: {e}")
@@ -150,16 +157,26 @@ def scan_repository_auto(temp_dir):
     services = []
     
     # Recursively search for deployable services in subdirectories
-    for item in os.listdir(temp_dir):
-        item_path = os.path.join(temp_dir, item)
-        
-        # Skip hidden directories and common non-service directories
-        if item.startswith('.') or item in SKIP_DIRECTORIES:
-            continue
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            item = entry.name
+            
+            # Skip hidden directories and common non-service directories
+            if item.startswith('.') or item in SKIP_DIRECTORIES:
+                continue
+            
+            # DirEntry caches the file type from the directory read, no stat() needed
+            if not entry.is_dir(follow_symlinks=False):
+                continue
             
-        if os.path.isdir(item_path):
-            # Check if this directory contains a deployable service
-            project_type, project_dir = detect_project_type(item_path)
+            # Check if this directory contains a deployable service, handing
+            # detection the listing so it doesn't stat each marker file again
+            try:
+                with os.scandir(entry.path) as listing:
+                    names = {sub_entry.name: sub_entry for sub_entry in listing}
+            except OSError:
+                continue
+            project_type, project_dir = detect_project_type_from_entries(entry.path, names)
             
             if project_type != "unknown":
                 # This is a deployable service
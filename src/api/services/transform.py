@@ -1,123 +1,152 @@
 import os
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from ..utils.files import find_files
+from ..config import SKIP_DIRECTORIES
 
 logger = logging.getLogger('quickdeploy')
 
-def transform_service_code(service, service_map):
+# Hardcoded local API URLs in frontend code, either assigned to a URL-ish
+# variable or passed straight to fetch/axios. Both forms live in one pattern
+# so each file is scanned once; only the variable form ignores case.
+# Patterns are bytes so files are rewritten without decoding them
+LOCAL_URL_RE = re.compile(
+    rb'(?i:(?P<keyword>const|let|var)\s+(?P<name>\w+URL|API_URL|apiUrl|baseUrl|BASE_URL|BACKEND_URL|BACKEND|SERVER_URL|SERVER)\s*=\s*[\'"]http://(?:localhost|127\.0\.0\.1):\d+(?P<variable_path>/\S*)[\'"])'
+    rb'|(?P<call>fetch|axios\.(?:get|post|put|delete))\s*\(\s*[\'"]http://(?:localhost|127\.0\.0\.1):\d+(?P<call_path>/\S*)[\'"]'
+)
+# Cheap check on the raw bytes that a file could match either pattern at all
+LOCAL_URL_HINT_RE = re.compile(rb'localhost|127\.0\.0\.1', re.IGNORECASE)
+
+# Flask CORS setup in backend code
+FLASK_HINT_RE = re.compile(rb'flask', re.IGNORECASE)
+FLASK_CORS_RE = re.compile(rb'flask[_-]cors', re.IGNORECASE)
+CORS_RESOURCES_RE = re.compile(rb'CORS\s*\(\s*app\s*,\s*resources\s*=\s*\{.*?\}\s*\)')
+CORS_PLAIN_RE = re.compile(rb'CORS\s*\(\s*app\s*\)')
+FLASK_IMPORT_RE = re.compile(rb'from flask import .*?\n')
+FLASK_APP_RE = re.compile(rb'app\s*=\s*Flask\s*\(__name__\)')
+
+# Directories that never hold frontend source worth rewriting
+FRONTEND_SKIP_DIRECTORIES = SKIP_DIRECTORIES | {'coverage'}
+FRONTEND_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx')
+
+def group_services_by_role(service_map):
+    """Group the entries of a service map by their service_role"""
+    services_by_role = {}
+    for info in service_map.values():
+        services_by_role.setdefault(info.get("service_role"), []).append(info)
+    return services_by_role
+
+def transform_service_code(service, service_map, services_by_role=None):
     """
     Transform code in a service to replace hardcoded URLs with service references
     - service: The service being transformed
     - service_map: Dictionary mapping service names to their deployment IDs
+    - services_by_role: service_map grouped by group_services_by_role, computed
+      once by callers transforming several services
     """
     path = service["path"]
     service_role = service.get("service_role", "")
+    if services_by_role is None:
+        services_by_role = group_services_by_role(service_map)
     
     if service_role == "frontend":
+        # Nothing to point a frontend at without a backend, skip walking its files
+        backend_services = services_by_role.get("backend")
+        if not backend_services:
+            return
         # Find and transform hardcoded API URLs in frontend code
-        transform_frontend_urls(path, service_map)
+        transform_frontend_urls(path, backend_services)
     elif service_role == "backend":
+        frontend_services = services_by_role.get("frontend")
+        if not frontend_services:
+            return
         # Update CORS and other configurations in backend code
-        transform_backend_config(path, service_map)
+        transform_backend_config(path, frontend_services)
 
-def transform_frontend_urls(directory, service_map):
+def transform_frontend_urls(directory, backend_services):
     """Replace hardcoded API URLs in frontend code"""
-    backend_services = {name: info for name, info in service_map.items() 
-                       if info.get("service_role") == "backend"}
-    
-    if not backend_services:
-        return
-        
     # First backend service URL to use if we find hardcoded URLs
-    default_backend = list(backend_services.values())[0]
+    default_backend = backend_services[0]
     default_backend_url = f"http://app-{default_backend['deployment_id']}"
     
-    # Scan for common patterns in JavaScript files
-    for root, dirs, files in os.walk(directory):
-        # Skip node_modules and other build directories
-        if 'node_modules' in root or 'build' in root or 'dist' in root:
-            continue
-            
-        for file in files:
-            # Only process JavaScript/TypeScript files
-            if file.endswith(('.js', '.jsx', '.ts', '.tsx')):
-                file_path = os.path.join(root, file)
-                
-                try:
-                    with open(file_path, 'r') as f:
-                        content = f.read()
-                    
-                    # Look for localhost or 127.0.0.1 URLs
-                    new_content = re.sub(
-                        r'(const|let|var)\s+(\w+URL|API_URL|apiUrl|baseUrl|BASE_URL|BACKEND_URL|BACKEND|SERVER_URL|SERVER)\s*=\s*[\'"]http://(localhost|127\.0\.0\.1):\d+(/\S*)[\'"]',
-                        f'\\1 \\2 = "{default_backend_url}\\4"',
-                        content,
-                        flags=re.IGNORECASE
-                    )
-                    
-                    # Replace fetch or axios calls directly to localhost
-                    new_content = re.sub(
-                        r'(fetch|axios\.get|axios\.post|axios\.put|axios\.delete)\s*\(\s*[\'"]http://(localhost|127\.0\.0\.1):\d+(/\S*)[\'"]',
-                        f'\\1("{default_backend_url}\\3"',
-                        new_content
-                    )
-                    
-                    if content != new_content:
-                        with open(file_path, 'w') as f:
-                            f.write(new_content)
-                        logger.info(f"Transformed API URL in {file_path}")
-                
-                except Exception as e:
-                    logger.warning(f"Error transforming {file_path}: {e}")
+    # Collect JavaScript/TypeScript files first, then rewrite them on a pool.
+    # Each file is independent, and the read and write-back of one can overlap
+    # with the others
+    source_files = []
+    for root, dirs, files in os.walk(directory, followlinks=False):
+        # Prune node_modules, build output and hidden directories so the walk never descends into them
+        dirs[:] = [d for d in dirs if d not in FRONTEND_SKIP_DIRECTORIES and not d.startswith('.')]
+        source_files.extend(os.path.join(root, file) for file in files if file.endswith(FRONTEND_EXTENSIONS))
+    
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4)) as executor:
+        for file_path in source_files:
+            executor.submit(transform_frontend_file, file_path, default_backend_url)
 
-def transform_backend_config(directory, service_map):
-    """Update backend configurations for CORS and database connections"""
-    frontend_services = {name: info for name, info in service_map.items() 
-                         if info.get("service_role") == "frontend"}
+def transform_frontend_file(file_path, backend_url):
+    """Rewrite hardcoded local API URLs in a single frontend source file"""
+    backend_url = backend_url.encode()
+    
+    def replace_url(match):
+        if match.group('keyword'):
+            return b'%s %s = "%s%s"' % (match.group('keyword'), match.group('name'), backend_url, match.group('variable_path'))
+        # Replace fetch or axios calls directly to localhost
+        return b'%s("%s%s"' % (match.group('call'), backend_url, match.group('call_path'))
     
-    if not frontend_services:
-        return
+    try:
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        
+        # Most files never mention a local URL, skip the rewrite for them
+        if not LOCAL_URL_HINT_RE.search(raw):
+            return
         
+        # Look for localhost or 127.0.0.1 URLs
+        new_content = LOCAL_URL_RE.sub(replace_url, raw)
+        
+        if raw != new_content:
+            with open(file_path, 'wb') as f:
+                f.write(new_content)
+            logger.info(f"Transformed API URL in {file_path}")
+    
+    except Exception as e:
+        logger.warning(f"Error transforming {file_path}: {e}")
+
+def transform_backend_config(directory, frontend_services):
+    """Update backend configurations for CORS and database connections"""
     # Generate allowed origins list for CORS
-    allowed_origins = [f"http://app-{info['deployment_id']}" for info in frontend_services.values()]
+    allowed_origins = [f"http://app-{info['deployment_id']}" for info in frontend_services]
     allowed_origins_str = ", ".join([f'"{origin}"' for origin in allowed_origins])
     
+    cors_call = f'CORS(app, resources={{r"/*": {{\"origins\": [{allowed_origins_str}]}}}})'.encode()
+    app_replacement = b'\\g<0>\nCORS(app, resources={r"/*": {"origins": [' + allowed_origins_str.encode() + b']}})'
+    
     # Flask specific configuration
     flask_files = find_files(directory, ["app.py", "main.py", "__init__.py"])
     for file_path in flask_files:
         try:
-            with open(file_path, 'r') as f:
+            with open(file_path, 'rb') as f:
                 content = f.read()
             
+            # Files that never mention flask cannot match any of the patterns below
+            if not FLASK_HINT_RE.search(content):
+                continue
+            
             # Update CORS configuration
-            if "flask_cors" in content.lower() or "flask-cors" in content.lower():
+            if FLASK_CORS_RE.search(content):
                 # Update existing CORS
-                new_content = re.sub(
-                    r'CORS\s*\(\s*app\s*,\s*resources\s*=\s*\{.*?\}\s*\)',
-                    f'CORS(app, resources={{r"/*": {{\"origins\": [{allowed_origins_str}]}}}})',
-                    content
-                )
+                new_content = CORS_RESOURCES_RE.sub(cors_call, content)
                 
                 if content == new_content:
                     # Try another pattern
-                    new_content = re.sub(
-                        r'CORS\s*\(\s*app\s*\)',
-                        f'CORS(app, resources={{r"/*": {{\"origins\": [{allowed_origins_str}]}}}})',
-                        content
-                    )
+                    new_content = CORS_PLAIN_RE.sub(cors_call, content)
             else:
                 # Add CORS if not present
-                import_pattern = r'from flask import .*?\n'
-                import_replacement = '\\g<0>from flask_cors import CORS\n'
-                new_content = re.sub(import_pattern, import_replacement, content)
-                
-                app_pattern = r'app\s*=\s*Flask\s*\(__name__\)'
-                app_replacement = '\\g<0>\nCORS(app, resources={r"/*": {"origins": [' + allowed_origins_str + ']}})'
-                new_content = re.sub(app_pattern, app_replacement, new_content)
+                new_content = FLASK_IMPORT_RE.sub(b'\\g<0>from flask_cors import CORS\n', content)
+                new_content = FLASK_APP_RE.sub(app_replacement, new_content)
             
             if content != new_content:
-                with open(file_path, 'w') as f:
+                with open(file_path, 'wb') as f:
                     f.write(new_content)
                 logger.info(f"Updated CORS configuration in {file_path}")
                 
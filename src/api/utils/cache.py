@@ -0,0 +1,56 @@
+import os
+import copy
+import functools
+import threading
+from collections import OrderedDict
+
+# Every directory cache, so a new job can start with all of them empty
+caches = []
+
+def directory_cache(maxsize=128):
+    """
+    Memoize a detection function whose last positional argument is a path.
+    Results are keyed by the other arguments, the path's real path and its
+    mtime. Only the top-level mtime is checked, so editing a file deeper in
+    the tree does not invalidate an entry. The worker calls clear_directory_caches
+    at the start of each job, so results are only shared between the scan,
+    detection and build steps of one checkout.
+    Callers get a deep copy, so mutating a result never changes the cached one.
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        caches.append((cache, lock))
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            directory = args[-1]
+            try:
+                real_path = os.path.realpath(directory)
+                key = args[:-1] + (real_path, os.stat(real_path).st_mtime_ns)
+            except OSError:
+                # Missing directories are not worth caching
+                return func(*args)
+
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return copy.deepcopy(cache[key])
+
+            result = func(*args)
+
+            with lock:
+                cache[key] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return copy.deepcopy(result)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+def clear_directory_caches():
+    """Empty every directory cache, e.g. before a job scans a new checkout"""
+    for cache, lock in caches:
+        with lock:
+            cache.clear()
\ No newline at end of file
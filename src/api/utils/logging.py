@@ -1,21 +1,39 @@
 import logging
 import os
+import sys
+
+# Repository-level logs directory, the same one start.sh writes to
+LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "logs"))
+
+configured = False
 
 def setup_logging():
     """Configure logging for QuickDeploy"""
-    log_dir = "../../logs"
+    global configured
+    if configured:
+        return logging.getLogger('quickdeploy')
     
     # Ensure log directory exists
-    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, "worker.log")
+    
+    # start.sh already redirects the worker's output into worker.log, so only
+    # add a file handler when stderr is not that same file
+    try:
+        redirected = os.path.samestat(os.fstat(sys.stderr.fileno()), os.stat(log_path))
+    except (OSError, ValueError):
+        redirected = False
+    
+    handlers = [logging.StreamHandler()]
+    if not redirected:
+        handlers.append(logging.FileHandler(log_path))
     
     logging.basicConfig(
         level=logging.DEBUG,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(os.path.join(log_dir, "worker.log")),
-            logging.StreamHandler()
-        ]
+        handlers=handlers
     )
+    configured = True
     
     # Create and return logger
     logger = logging.getLogger('quickdeploy')
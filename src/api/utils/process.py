@@ -0,0 +1,23 @@
+import subprocess
+import logging
+from collections import deque
+
+logger = logging.getLogger('quickdeploy')
+
+def run_streamed(cmd, cwd=None, env=None, tail_lines=50):
+    """
+    Run a command, logging its combined stdout/stderr as it arrives.
+    Raises CalledProcessError with the last lines of output on failure.
+    """
+    tail = deque(maxlen=tail_lines)
+    with subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, bufsize=1 << 20) as proc:
+        # Only one pipe is open, so draining it here cannot deadlock
+        for line in proc.stdout:
+            line = line.rstrip().decode(errors="replace")
+            tail.append(line)
+            logger.debug(line)
+        returncode = proc.wait()
+
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, output="\n".join(tail))
\ No newline at end of file
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import tempfile
 import shutil
@@ -7,6 +8,7 @@ from datetime import datetime
 import sys
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up base path for module imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,22 +17,41 @@ sys.path.append(parent_dir)
 
 # Custom modules
 from api.utils.logging import setup_logging
-from api.config import REDIS_HOST, REDIS_PORT, REDIS_DB, INGRESS_PORT
+from api.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_MAX_CONNECTIONS, INGRESS_PORT
 from api.db import init_database, update_deployment_status
 from api.kubernetes.client import k8s_client
-from api.kubernetes.deploy import deploy_to_kubernetes, provision_database
+from api.kubernetes.deploy import deploy_to_kubernetes, wait_for_deployments, provision_database
 from api.utils.files import clone_repository
+from api.utils.cache import clear_directory_caches
 from api.services.scan import scan_repository
-from api.detection.project import detect_project_type, detect_default_port
-from api.services.build import build_project
-from api.services.transform import transform_service_code
+from api.detection.project import detect_default_port
+from api.detection.combined import detect_services
+from api.services.build import build_project, build_cache_key
+from api.services.transform import transform_service_code, group_services_by_role
 
 # Set up logger
 logger = setup_logging()
 
+# Seconds BRPOP waits on the build queue before returning empty-handed
+QUEUE_POLL_TIMEOUT = 5
+
+# Long-lived pool for blocking work that can overlap with a job's builds,
+# shared across jobs so threads aren't started per deployment
+io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="worker-io")
+
 # Connect to Redis
 try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    # The worker holds this connection for hours between jobs: keepalive stops
+    # idle sockets from being dropped silently, and the health check pings
+    # before reusing one that has sat idle longer than the interval. The socket
+    # timeout has to outlast BRPOP's own blocking timeout
+    redis_pool = redis.ConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=QUEUE_POLL_TIMEOUT + 5,
+        socket_keepalive=True, health_check_interval=30
+    )
+    redis_client = redis.Redis(connection_pool=redis_pool)
     redis_client.ping()
     logger.info("Connected to Redis successfully")
 except Exception as e:
@@ -38,10 +59,12 @@ except Exception as e:
 
 def process_build_job():
     """Process a build job from the queue"""
-    # Get job from queue
-    job_data = redis_client.rpop("build_queue")
-    if not job_data:
+    # Block until a job arrives instead of polling; the timeout only bounds how
+    # long the main loop goes without control returning to it
+    result = redis_client.brpop("build_queue", timeout=QUEUE_POLL_TIMEOUT)
+    if not result:
         return False
+    _, job_data = result
     
     try:
         job = json.loads(job_data)
@@ -59,6 +82,9 @@ def process_build_job():
         # Update status to building
         update_deployment_status(deployment_id, "building")
         
+        # Detection results are only valid for this job's checkout
+        clear_directory_caches()
+        
         # Create temporary directory
         temp_dir = tempfile.mkdtemp()
         try:
@@ -78,25 +104,30 @@ def process_build_job():
                 
             logger.info(f"Found {len(services)} services: {[s['name'] for s in services]}")
             
-            # For each service, make sure type and port are set correctly
+            # Detect the type of services that leave it unset, all concurrently
+            auto_services = [service for service in services if service["type"] == "auto" or not service["type"]]
+            detections = asyncio.run(detect_services([service["path"] for service in auto_services]))
+            for service, (project_type, _, port) in zip(auto_services, detections):
+                service["type"] = project_type
+                # If port is 0 or not set, use the one found while detecting
+                if not service["port"]:
+                    service["port"] = port
+            
+            # Services with an explicit type but no port use the type's default
             for service in services:
-                # If type is 'auto' or not set, detect it
-                if service["type"] == "auto" or not service["type"]:
-                    project_type, _ = detect_project_type(service["path"])
-                    service["type"] = project_type
-                
-                # If port is 0 or not set, use default for type
                 if not service["port"]:
                     service["port"] = detect_default_port(service["type"])
             
-            # Provision databases
-            db_infos = {}
+            # Provision databases in the background; nothing needs them until
+            # the deploy pass, so container startup overlaps with the builds
+            db_futures = {}
             for service in services:
                 if "databases" in service:
                     for db_config in service["databases"]:
                         db_name = db_config["name"]
-                        if db_name not in db_infos:
-                            db_infos[db_name] = provision_database(
+                        if db_name not in db_futures:
+                            db_futures[db_name] = io_pool.submit(
+                                provision_database,
                                 db_config["type"],
                                 db_config.get("version", "14"),
                                 f"db-{deployment_id[:8]}-{db_name}"
@@ -182,7 +213,8 @@ def process_build_job():
                     service["path"],
                     temp_dir,
                     service_id,
-                    service_environments[service_name]
+                    service_environments[service_name],
+                    cache_key=build_cache_key(repo_url, service_name)
                 )
                 
                 if not image_result:
@@ -204,11 +236,16 @@ def process_build_job():
                 for name, id in service_deployment_ids.items()
             }
             
+            services_by_role = group_services_by_role(service_map)
             for service in services:
-                transform_service_code(service, service_map)
+                transform_service_code(service, service_map, services_by_role)
+            
+            # Wait for the databases provisioned alongside the builds
+            db_infos = {db_name: future.result() for db_name, future in db_futures.items()}
             
             # Second pass: deploy all services with proper connectivity
             deployment_urls = {}
+            rollouts = {}
             
             for service in services:
                 service_name = service["name"]
@@ -226,7 +263,7 @@ def process_build_job():
                 logger.info(f"Deploying service {service_name}...")
                 image_name = service_builds[service_name]
                 
-                deployment_url = deploy_to_kubernetes(
+                deploy_result = deploy_to_kubernetes(
                     image_name,
                     service_id,
                     service["type"],
@@ -235,12 +272,20 @@ def process_build_job():
                     service_env
                 )
                 
-                if not deployment_url:
+                if not deploy_result:
                     logger.error(f"Failed to deploy service {service_name}")
                     update_deployment_status(deployment_id, "failed")
                     return True
                     
+                deployment_url, generation = deploy_result
                 deployment_urls[service_name] = deployment_url
+                rollouts[f"app-{service_id}"] = generation
+            
+            # Wait for every service's pods at once rather than one after another
+            logger.info(f"Waiting for {len(rollouts)} deployments to become ready...")
+            if not wait_for_deployments(rollouts):
+                update_deployment_status(deployment_id, "failed")
+                return True
             
             # Update status to deployed with all URLs
             logger.info(f"WORKER: About to update deployment {deployment_id} status to deployed with URLs: {json.dumps(deployment_urls)}")
@@ -254,9 +299,10 @@ def process_build_job():
             logger.info(f"Deployment successful: {deployment_urls}")
             
         finally:
-            # Clean up temporary directory
+            # Clean up temporary directory in the background so the next job
+            # can start; nothing reads the checkout once the job is done
             logger.info(f"Cleaning up temporary directory...")
-            shutil.rmtree(temp_dir)
+            io_pool.submit(shutil.rmtree, temp_dir, ignore_errors=True)
     except Exception as e:
         logger.error(f"Error processing job: {e}")
         if 'deployment_id' in locals():
@@ -278,9 +324,8 @@ def main():
     # Main processing loop
     while True:
         try:
-            if not process_build_job():
-                # No jobs in queue, sleep for a bit
-                time.sleep(5)
+            # Returns False after waiting QUEUE_POLL_TIMEOUT seconds for a job
+            process_build_job()
         except Exception as e:
             logger.error(f"Error processing job: {e}")
             time.sleep(5)
@@ -105,20 +105,21 @@ def deploy_local(args):
             shutil.copytree(directory, temp_dir, dirs_exist_ok=True)
         
         # Create a temporary local git repository
+        # Output is discarded rather than piped, git commit lists every file
         with console.status("[bold green]Creating temporary git repository..."):
-            subprocess.run(["git", "init"], cwd=temp_dir, check=True, stdout=subprocess.PIPE)
-            subprocess.run(["git", "add", "."], cwd=temp_dir, check=True, stdout=subprocess.PIPE)
+            subprocess.run(["git", "init"], cwd=temp_dir, check=True, stdout=subprocess.DEVNULL)
+            subprocess.run(["git", "add", "."], cwd=temp_dir, check=True, stdout=subprocess.DEVNULL)
             subprocess.run(
                 ["git", "config", "user.email", "quickdeploy@example.com"], 
-                cwd=temp_dir, check=True, stdout=subprocess.PIPE
+                cwd=temp_dir, check=True, stdout=subprocess.DEVNULL
             )
             subprocess.run(
                 ["git", "config", "user.name", "QuickDeploy"], 
-                cwd=temp_dir, check=True, stdout=subprocess.PIPE
+                cwd=temp_dir, check=True, stdout=subprocess.DEVNULL
             )
             subprocess.run(
                 ["git", "commit", "-m", "Local deployment"], 
-                cwd=temp_dir, check=True, stdout=subprocess.PIPE
+                cwd=temp_dir, check=True, stdout=subprocess.DEVNULL
             )
         
         # Get the commit hash